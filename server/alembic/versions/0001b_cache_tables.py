@@ -0,0 +1,47 @@
+"""add enhanced_prompt_cache and generation_results tables
+
+Revision ID: 0001b_cache_tables
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:15:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001b_cache_tables'
+down_revision: Union[str, None] = '0001_baseline'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'enhanced_prompt_cache',
+        sa.Column('prompt_key', sa.String(length=64), nullable=False),
+        sa.Column('normalized_prompt', sa.Text(), nullable=True),
+        sa.Column('enhanced_prompt', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('prompt_key')
+    )
+    op.create_index(op.f('ix_enhanced_prompt_cache_expires_at'), 'enhanced_prompt_cache', ['expires_at'], unique=False)
+    op.create_table(
+        'generation_results',
+        sa.Column('result_key', sa.String(length=64), nullable=False),
+        sa.Column('provider', sa.String(), nullable=True),
+        sa.Column('size', sa.String(), nullable=True),
+        sa.Column('variant_index', sa.Integer(), nullable=True),
+        sa.Column('image_url', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('result_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('generation_results')
+    op.drop_index(op.f('ix_enhanced_prompt_cache_expires_at'), table_name='enhanced_prompt_cache')
+    op.drop_table('enhanced_prompt_cache')
@@ -0,0 +1,73 @@
+"""add generated_images.prompt_hash with partial dedup index
+
+Revision ID: 0002_prompt_hash
+Revises: 0001b_cache_tables
+Create Date: 2026-10-18 09:30:00
+
+"""
+from typing import Sequence, Union
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002_prompt_hash'
+down_revision: Union[str, None] = '0001b_cache_tables'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 1000
+
+generated_images = sa.table(
+    'generated_images',
+    sa.column('id', sa.String),
+    sa.column('original_prompt', sa.Text),
+    sa.column('prompt_hash', sa.String),
+)
+
+
+def upgrade() -> None:
+    op.add_column('generated_images', sa.Column('prompt_hash', sa.String(length=64), nullable=True))
+
+    # Hashes are computed in Python (sha256 has no portable SQL form), one
+    # executemany per batch. Alembic runs the whole revision in a single
+    # transaction, so batching bounds memory, not transaction size.
+    conn = op.get_bind()
+    update = (
+        generated_images.update()
+        .where(generated_images.c.id == sa.bindparam('row_id'))
+        .values(prompt_hash=sa.bindparam('hash'))
+    )
+    last_id = ''
+    while True:
+        rows = conn.execute(
+            sa.select(generated_images.c.id, generated_images.c.original_prompt)
+            .where(generated_images.c.id > last_id)
+            .where(generated_images.c.original_prompt.is_not(None))
+            .order_by(generated_images.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        conn.execute(update, [
+            {'row_id': row_id, 'hash': hashlib.sha256(prompt.encode('utf-8')).hexdigest()}
+            for row_id, prompt in rows
+        ])
+
+    op.create_index(
+        'ix_generated_images_user_prompt_hash',
+        'generated_images',
+        ['user_id', 'prompt_hash'],
+        unique=False,
+        postgresql_where=sa.text('is_deleted = false'),
+        sqlite_where=sa.text('is_deleted = 0'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_generated_images_user_prompt_hash', table_name='generated_images')
+    with op.batch_alter_table('generated_images') as batch_op:
+        batch_op.drop_column('prompt_hash')
@@ -0,0 +1,31 @@
+"""add keyset pagination index for image history
+
+Revision ID: 0003_history_keyset_index
+Revises: 0002_prompt_hash
+Create Date: 2026-10-18 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003_history_keyset_index'
+down_revision: Union[str, None] = '0002_prompt_hash'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_generated_images_user_history',
+        'generated_images',
+        ['user_id', 'is_deleted', sa.text('created_at DESC'), 'id'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_generated_images_user_history', table_name='generated_images')
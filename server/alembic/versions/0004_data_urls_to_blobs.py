@@ -0,0 +1,96 @@
+"""move inline base64 data URLs into the blob store
+
+Revision ID: 0004_data_urls_to_blobs
+Revises: 0003_history_keyset_index
+Create Date: 2026-10-18 10:30:00
+
+"""
+from typing import Sequence, Union
+import base64
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.services.blob_store import blob_store, blob_ref
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004_data_urls_to_blobs'
+down_revision: Union[str, None] = '0003_history_keyset_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 100
+
+generated_images = sa.table(
+    'generated_images',
+    sa.column('id', sa.String),
+    sa.column('image_urls', sa.Text),
+)
+
+generation_results = sa.table(
+    'generation_results',
+    sa.column('result_key', sa.String),
+    sa.column('image_url', sa.Text),
+)
+
+
+def to_blob_ref(url: str) -> str:
+    if not isinstance(url, str) or not url.startswith('data:'):
+        return url
+    header, _, payload = url.partition(',')
+    if ';base64' not in header:
+        return url
+    return blob_ref(blob_store.put(base64.b64decode(payload)))
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    last_id = ''
+    while True:
+        rows = conn.execute(
+            sa.select(generated_images.c.id, generated_images.c.image_urls)
+            .where(generated_images.c.id > last_id)
+            .where(generated_images.c.image_urls.like('%data:%'))
+            .order_by(generated_images.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for row_id, image_urls in rows:
+            last_id = row_id
+            try:
+                urls = json.loads(image_urls)
+            except (TypeError, ValueError):
+                continue
+            conn.execute(
+                generated_images.update()
+                .where(generated_images.c.id == row_id)
+                .values(image_urls=json.dumps([to_blob_ref(url) for url in urls]))
+            )
+
+    last_key = ''
+    while True:
+        rows = conn.execute(
+            sa.select(generation_results.c.result_key, generation_results.c.image_url)
+            .where(generation_results.c.result_key > last_key)
+            .where(generation_results.c.image_url.like('data:%'))
+            .order_by(generation_results.c.result_key)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        for result_key, image_url in rows:
+            last_key = result_key
+            conn.execute(
+                generation_results.update()
+                .where(generation_results.c.result_key == result_key)
+                .values(image_url=to_blob_ref(image_url))
+            )
+
+
+def downgrade() -> None:
+    # Blob references keep working after a schema downgrade, so there is nothing to undo
+    pass
@@ -0,0 +1,47 @@
+"""add generation_jobs table
+
+Revision ID: 0005_generation_jobs
+Revises: 0004_data_urls_to_blobs
+Create Date: 2026-10-18 11:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005_generation_jobs'
+down_revision: Union[str, None] = '0004_data_urls_to_blobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'generation_jobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('user_id', sa.String(), nullable=True),
+        sa.Column('prompt', sa.Text(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('force', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('image_id', sa.String(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['image_id'], ['generated_images.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['users.user_id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_generation_jobs_id'), 'generation_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_generation_jobs_status'), 'generation_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_generation_jobs_user_id'), 'generation_jobs', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generation_jobs_user_id'), table_name='generation_jobs')
+    op.drop_index(op.f('ix_generation_jobs_status'), table_name='generation_jobs')
+    op.drop_index(op.f('ix_generation_jobs_id'), table_name='generation_jobs')
+    op.drop_table('generation_jobs')
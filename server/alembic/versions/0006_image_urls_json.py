@@ -0,0 +1,51 @@
+"""store generated_images.image_urls as native JSON
+
+Revision ID: 0006_image_urls_json
+Revises: 0005_generation_jobs
+Create Date: 2026-10-18 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006_image_urls_json'
+down_revision: Union[str, None] = '0005_generation_jobs'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+
+    if conn.dialect.name == 'postgresql':
+        # Rows were always written with json.dumps, so the text casts cleanly
+        op.alter_column(
+            'generated_images',
+            'image_urls',
+            type_=postgresql.JSONB(),
+            postgresql_using="CASE WHEN image_urls IS NULL OR image_urls = '' THEN '[]'::jsonb ELSE image_urls::jsonb END",
+        )
+    else:
+        # SQLite keeps JSON as text, which is what the column already holds;
+        # only rows the old reader would have shown as empty need fixing
+        conn.execute(sa.text(
+            "UPDATE generated_images SET image_urls = '[]' "
+            "WHERE image_urls IS NULL OR image_urls = '' OR json_valid(image_urls) = 0"
+        ))
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+
+    if conn.dialect.name == 'postgresql':
+        op.alter_column(
+            'generated_images',
+            'image_urls',
+            type_=sa.Text(),
+            postgresql_using='image_urls::text',
+        )
@@ -0,0 +1,33 @@
+"""normalize generated_images.created_at text on SQLite
+
+Revision ID: 0007_sqlite_created_at_format
+Revises: 0006_image_urls_json
+Create Date: 2026-10-18 12:30:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007_sqlite_created_at_format'
+down_revision: Union[str, None] = '0006_image_urls_json'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # SQLite stores datetimes as text. Rows from the CURRENT_TIMESTAMP default
+    # read 'YYYY-MM-DD HH:MM:SS' while SQLAlchemy binds 'YYYY-MM-DD HH:MM:SS.ffffff',
+    # so the history keyset comparison misses them. PostgreSQL has a real type.
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute(
+            "UPDATE generated_images SET created_at = created_at || '.000000' "
+            "WHERE length(created_at) = 19"
+        )
+
+
+def downgrade() -> None:
+    # The padded values are still valid datetimes
+    pass
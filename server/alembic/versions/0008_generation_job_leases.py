@@ -0,0 +1,29 @@
+"""add owner and heartbeat to generation_jobs
+
+Revision ID: 0008_generation_job_leases
+Revises: 0007_sqlite_created_at_format
+Create Date: 2026-10-18 13:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008_generation_job_leases'
+down_revision: Union[str, None] = '0007_sqlite_created_at_format'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('generation_jobs', sa.Column('owner', sa.String(), nullable=True))
+    op.add_column('generation_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('generation_jobs') as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('owner')
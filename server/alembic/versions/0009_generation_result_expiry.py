@@ -0,0 +1,31 @@
+"""add expires_at to generation_results
+
+Revision ID: 0009_generation_result_expiry
+Revises: 0008_generation_job_leases
+Create Date: 2026-10-18 14:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009_generation_result_expiry'
+down_revision: Union[str, None] = '0008_generation_job_leases'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing rows keep a NULL expires_at: reads skip them and the next purge
+    # deletes them, so the cache refills with entries that do expire
+    op.add_column('generation_results', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_generation_results_expires_at'), 'generation_results', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_generation_results_expires_at'), table_name='generation_results')
+    with op.batch_alter_table('generation_results') as batch_op:
+        batch_op.drop_column('expires_at')
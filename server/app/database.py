@@ -1,16 +1,36 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from app.utils.log import get_logger
 
 load_dotenv()
 
+logger = get_logger("database")
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./stockly.db")
+# Create tables from the models at startup instead of running migrations (development only)
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "false").lower() in ("1", "true", "yes")
 
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def to_async_url(url: str) -> str:
+    """Map a sync DATABASE_URL onto its async driver (asyncpg / aiosqlite)"""
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", to_async_url(DATABASE_URL))
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, pool_pre_ping=not ASYNC_DATABASE_URL.startswith("sqlite"))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -20,15 +40,25 @@ def get_db():
     finally:
         db.close()
 
-# Only create tables if not using SQLite (for development)
-if not DATABASE_URL.startswith("sqlite"):
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def create_tables():
+    """
+    Build any missing tables straight from the models. A development shortcut
+    behind DB_CREATE_ALL, called from app startup only: Alembic owns the schema
+    everywhere else, and this module is imported by alembic/env.py.
+    """
+    # Import all models here to ensure they are registered with SQLAlchemy
+    from app.models.user import User
+    from app.models.generated_image import GeneratedImage
+    from app.models.prompt_cache import EnhancedPromptCache
+    from app.models.generation_result import GenerationResult
+    from app.models.generation_job import GenerationJob
+
     try:
-        # Import all models here to ensure they are registered with SQLAlchemy
-        from app.models.user import User
-        from app.models.generated_image import GeneratedImage
-        
         Base.metadata.create_all(bind=engine)
-        print("Database tables created successfully")
+        logger.info("Database tables created successfully")
     except Exception as e:
-        print(f"Failed to create database tables: {e}")
-        print("Make sure your database is running and credentials are correct")
+        logger.error("Failed to create database tables; make sure your database is running and credentials are correct", error=str(e))
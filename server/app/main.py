@@ -1,13 +1,34 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response
+from app.utils.log import configure_logging, shutdown_logging
+
+# Before the app imports below, so records logged while they load are kept
+configure_logging()
+
 from app.routes import auth, images
+from app.database import async_engine, create_tables, DB_CREATE_ALL
+from app.services.http_client import close_http_client
+from app.services.prompt_enhancer import prompt_enhancer
+from app.services.prompt_cache import prompt_cache
+from app.services.result_cache import result_cache
+from app.services.derivatives import derivative_renderer
+from app.services.providers import image_router
+from app.services.job_queue import generation_jobs
+from app.services.warmup import warm_up, WARMUP_ON_STARTUP
+from app.utils.auth import password_hasher
+from app.utils.circuit_breaker import breaker_states
+from app.utils.rate_limit import generation_rate_limiter
+from app.utils.metrics import REQUEST_SECONDS, render_metrics
+from prometheus_client import CONTENT_TYPE_LATEST
+import time
 
 app = FastAPI(
     title="Stockly API",
     version="1.0.0",
-    description="AI Image Generation API with Google OAuth and JWT Authentication"
+    description="AI Image Generation API with Google OAuth and JWT Authentication",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -17,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 # Security middleware
@@ -30,10 +52,43 @@ async def add_security_headers(request: Request, call_next):
     response.headers["X-XSS-Protection"] = "1; mode=block"
     return response
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not raw path, so ids don't explode the series count
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code)
+    ).observe(time.perf_counter() - started)
+    return response
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(images.router, prefix="/api/images", tags=["Images"])
 
+@app.on_event("startup")
+async def start_workers():
+    if DB_CREATE_ALL:
+        create_tables()
+    await generation_jobs.start()
+    if WARMUP_ON_STARTUP:
+        # Runs before the worker starts accepting requests
+        await warm_up()
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    await generation_jobs.stop()
+    await close_http_client()
+    prompt_enhancer.shutdown()
+    derivative_renderer.shutdown()
+    password_hasher.shutdown()
+    await async_engine.dispose()
+    # Last, so the records logged while shutting down are flushed
+    shutdown_logging()
+
 @app.get("/")
 async def root():
     return {
@@ -44,12 +99,31 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "prompt_cache": prompt_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "image_providers": image_router.stats()
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus exposition of request, stage, provider, cache and fallback metrics"""
+    return Response(render_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+@app.get("/diagnostics")
+async def diagnostics():
+    """Circuit breaker state and routing stats for every outbound dependency"""
+    return {
+        "circuit_breakers": breaker_states(),
+        "image_providers": image_router.stats(),
+        "generation_rate_limit": generation_rate_limiter.stats()
+    }
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
     )
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
-import json
+import hashlib
+from datetime import datetime
+
+def compute_prompt_hash(prompt: str) -> str:
+    """sha256 of the exact prompt text, used for indexed dedup lookups"""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
 
 class GeneratedImage(Base):
     __tablename__ = "generated_images"
@@ -10,23 +16,46 @@ class GeneratedImage(Base):
     id = Column(String, primary_key=True, index=True)
     user_id = Column(String, ForeignKey("users.user_id"))
     original_prompt = Column(Text)
+    prompt_hash = Column(String(64), nullable=True)
     enhanced_prompt = Column(Text, nullable=True)
-    image_urls = Column(Text)  # JSON string
+    # List of URLs; JSONB on PostgreSQL, JSON text on SQLite
+    image_urls = Column(JSON().with_variant(JSONB(), "postgresql"))
     category = Column(String, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Always written by the ORM: on SQLite, CURRENT_TIMESTAMP stores no
+    # fractional seconds and would not compare correctly with history cursors
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow, server_default=func.now())
     is_deleted = Column(Boolean, default=False)
 
     user = relationship("User", back_populates="images")
 
+    __table_args__ = (
+        # Dedup probe for /generate; only live rows are indexed
+        Index(
+            "ix_generated_images_user_prompt_hash",
+            "user_id",
+            "prompt_hash",
+            postgresql_where=(is_deleted == False),
+            sqlite_where=(is_deleted == False),
+        ),
+        # Keyset pagination for /history
+        Index(
+            "ix_generated_images_user_history",
+            "user_id",
+            "is_deleted",
+            created_at.desc(),
+            "id",
+        ),
+    )
+
     def __init__(self, **kwargs):
-        if 'image_urls' in kwargs and isinstance(kwargs['image_urls'], list):
-            kwargs['image_urls'] = json.dumps(kwargs['image_urls'])
+        if kwargs.get('original_prompt') is not None and 'prompt_hash' not in kwargs:
+            kwargs['prompt_hash'] = compute_prompt_hash(kwargs['original_prompt'])
         super().__init__(**kwargs)
 
     @property
     def image_urls_list(self):
-        return json.loads(self.image_urls) if self.image_urls else []
+        return self.image_urls or []
 
     @image_urls_list.setter
     def image_urls_list(self, value):
-        self.image_urls = json.dumps(value)
+        self.image_urls = value
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+class GenerationJob(Base):
+    __tablename__ = "generation_jobs"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(String, ForeignKey("users.user_id"), index=True)
+    prompt = Column(Text)
+    category = Column(String, nullable=True)
+    force = Column(Boolean, default=False)
+    status = Column(String, default=QUEUED, index=True)
+    image_id = Column(String, ForeignKey("generated_images.id"), nullable=True)
+    error = Column(Text, nullable=True)
+    # Process running the job and its last sign of life; a running job whose
+    # heartbeat is older than the lease is treated as abandoned
+    owner = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
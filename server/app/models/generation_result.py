@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+class GenerationResult(Base):
+    __tablename__ = "generation_results"
+
+    result_key = Column(String(64), primary_key=True)  # sha256 of (enhanced prompt, provider, size, variant)
+    provider = Column(String)
+    size = Column(String)
+    variant_index = Column(Integer)
+    image_url = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)
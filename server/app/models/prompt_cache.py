@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+class EnhancedPromptCache(Base):
+    __tablename__ = "enhanced_prompt_cache"
+
+    prompt_key = Column(String(64), primary_key=True)  # sha256 of the normalized prompt
+    normalized_prompt = Column(Text)
+    enhanced_prompt = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), index=True)
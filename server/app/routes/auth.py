@@ -1,33 +1,58 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Body
-from sqlalchemy.orm import Session
-from app.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.database import get_async_db
 from app.models.user import User
 from app.schemas import UserCreate, Token, User as UserSchema, LoginRequest, OAuthCallbackRequest, UserUpdate
-from app.utils.auth import create_access_token, create_refresh_token, verify_access_token, verify_refresh_token, hash_password, verify_password
+from app.utils.auth import create_access_token, create_refresh_token, verify_token_payload, verify_refresh_token, password_hasher, PasswordHasherBusy
+from app.utils.user_cache import get_user_identity, invalidate_user
+from app.services.google_oauth import get_google_profile, authorization_url, GoogleOAuthError
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import requests
-import os
+import httpx
 from dotenv import load_dotenv
 from typing import Dict
 import uuid
 import secrets
 from datetime import datetime
+from app.utils.log import get_logger
 
 load_dotenv()
 
+logger = get_logger("routes.auth")
+
+USER_ID_CANDIDATES = 8
+
 def generate_user_id(first_name: str, last_name: str) -> str:
     base = f"{first_name.lower()}{last_name.lower()}"
     unique = secrets.token_hex(4)
     return f"{base}{unique}"
 
+async def generate_unique_user_id(db: AsyncSession, first_name: str, last_name: str) -> str:
+    """Pick a free user_id, checking a batch of random candidates with one query"""
+    while True:
+        candidates = [generate_user_id(first_name, last_name) for _ in range(USER_ID_CANDIDATES)]
+        taken = set((await db.scalars(select(User.user_id).where(User.user_id.in_(candidates)))).all())
+        for candidate in candidates:
+            if candidate not in taken:
+                return candidate
+
 router = APIRouter()
 security = HTTPBearer()
 
-GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
-GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:3001/auth/callback")
+def password_hasher_busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many authentication requests, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
+async def hash_password_or_503(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_error()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
     token = credentials.credentials
     if not token:
         raise HTTPException(
@@ -36,80 +61,50 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_id = verify_access_token(token)  # Use access token for user verification
-    if not user_id:
+    payload = verify_token_payload(token, "access")  # Use access token for user verification
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    # Verify user still exists
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # Verify user still exists (cached for the token's remaining lifetime)
+    identity = await get_user_identity(db, payload["sub"], payload.get("exp"))
+    if not identity:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return user_id
+    return identity.id
 
 @router.get("/google/url")
 async def get_google_auth_url():
     """Get Google OAuth authorization URL"""
-    auth_url = (
-        "https://accounts.google.com/o/oauth2/v2/auth?"
-        f"client_id={GOOGLE_CLIENT_ID}&"
-        "response_type=code&"
-        "scope=openid%20email%20profile&"
-        f"redirect_uri={GOOGLE_REDIRECT_URI}&"
-        "access_type=offline&"
-        "prompt=consent"
-    )
-    return {"auth_url": auth_url}
+    return {"auth_url": authorization_url()}
 
 @router.post("/google/callback", response_model=Token)
-async def google_oauth_callback(request: OAuthCallbackRequest, db: Session = Depends(get_db)):
+async def google_oauth_callback(request: OAuthCallbackRequest, db: AsyncSession = Depends(get_async_db)):
     """Handle Google OAuth callback"""
     try:
-        # Exchange authorization code for access token
-        token_url = "https://oauth2.googleapis.com/token"
-        data = {
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "code": request.code,
-            "grant_type": "authorization_code",
-            "redirect_uri": GOOGLE_REDIRECT_URI
-        }
-
-        token_response = requests.post(token_url, data=data)
-        token_response.raise_for_status()
-        token_data = token_response.json()
-
-        # Get user info from Google
-        user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-        headers = {"Authorization": f"Bearer {token_data['access_token']}"}
-
-        user_response = requests.get(user_info_url, headers=headers)
-        user_response.raise_for_status()
-        user_data = user_response.json()
+        # Exchange the code and read the user's identity from the verified ID token
+        user_data = await get_google_profile(request.code)
 
         # Check if user exists by google_id
-        user = db.query(User).filter(User.google_id == user_data["id"]).first()
-        print(f"OAuth callback: User lookup by google_id {user_data['id']}: {'found' if user else 'not found'}")
+        user = await db.scalar(select(User).where(User.google_id == user_data["id"]))
 
         if not user:
             # Check if user exists by email (for account linking)
-            existing_user = db.query(User).filter(User.email == user_data["email"]).first()
+            existing_user = await db.scalar(select(User).where(User.email == user_data["email"]))
             if existing_user:
-                print(f"OAuth callback: Linking Google account to existing user {existing_user.email}")
+                logger.info("OAuth callback: linking Google account to existing user", user_id=existing_user.user_id)
                 # Link Google account to existing user
                 existing_user.google_id = user_data["id"]
                 existing_user.avatar_url = user_data.get("picture", existing_user.avatar_url)
                 user = existing_user
             else:
-                print(f"OAuth callback: Creating new user for {user_data['email']}")
                 # Parse name into first and last name
                 full_name = user_data["name"]
                 name_parts = full_name.split(" ", 1)
@@ -117,12 +112,7 @@ async def google_oauth_callback(request: OAuthCallbackRequest, db: Session = Dep
                 last_name = name_parts[1] if len(name_parts) > 1 else ""
 
                 # Generate unique user_id
-                base_user_id = generate_user_id(first_name, last_name)
-                user_id = base_user_id
-                counter = 1
-                while db.query(User).filter(User.user_id == user_id).first():
-                    user_id = f"{base_user_id}{counter}"
-                    counter += 1
+                user_id = await generate_unique_user_id(db, first_name, last_name)
 
                 user = User(
                     id=str(uuid.uuid4()),  # Use UUID for primary key
@@ -136,7 +126,6 @@ async def google_oauth_callback(request: OAuthCallbackRequest, db: Session = Dep
                 )
                 db.add(user)
         else:
-            print(f"OAuth callback: Updating existing user {user.email}")
             # Update user information from Google
             user.avatar_url = user_data.get("picture", user.avatar_url)
             user.name = user_data["name"]
@@ -144,9 +133,10 @@ async def google_oauth_callback(request: OAuthCallbackRequest, db: Session = Dep
             user.first_name = name_parts[0]
             user.last_name = name_parts[1] if len(name_parts) > 1 else ""
 
-        db.commit()
-        db.refresh(user)
-        print(f"OAuth callback: User {user.email} authenticated successfully with user_id {user.user_id}")
+        await db.commit()
+        await db.refresh(user)
+        invalidate_user(user.id)
+        logger.info("OAuth callback: user authenticated", user_id=user.user_id)
 
         # Create tokens
         access_token = create_access_token(data={"sub": user.id})
@@ -158,21 +148,21 @@ async def google_oauth_callback(request: OAuthCallbackRequest, db: Session = Dep
             "token_type": "bearer"
         }
 
-    except requests.RequestException as e:
-        print(f"OAuth request error: {str(e)}")
+    except (httpx.HTTPError, GoogleOAuthError) as e:
+        logger.warning("OAuth request error", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"OAuth authentication failed: {str(e)}"
         )
     except Exception as e:
-        print(f"OAuth callback error: {str(e)}")
+        logger.exception("OAuth callback error")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Authentication error: {str(e)}"
         )
 
 @router.post("/refresh", response_model=Dict[str, str])
-async def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)):
+async def refresh_access_token(refresh_token: str, db: AsyncSession = Depends(get_async_db)):
     """Refresh access token using refresh token"""
     if not refresh_token:
         raise HTTPException(
@@ -188,7 +178,7 @@ async def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)
         )
 
     # Verify user still exists
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_user_identity(db, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -208,10 +198,10 @@ async def refresh_access_token(refresh_token: str, db: Session = Depends(get_db)
 @router.get("/me", response_model=UserSchema)
 async def get_current_user_profile(
     current_user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current user profile"""
-    user = db.query(User).filter(User.id == current_user_id).first()
+    user = await db.scalar(select(User).where(User.id == current_user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -220,10 +210,10 @@ async def get_current_user_profile(
     return user
 
 @router.post("/register", response_model=UserSchema)
-async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user with email and password"""
     # Check if user already exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User.id).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -231,7 +221,7 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Hash the password
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_or_503(user_data.password)
     
     # Create new user
     new_user = User(
@@ -246,16 +236,16 @@ async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     
     return new_user
 
 @router.post("/login", response_model=Token)
-async def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
+async def login_user(login_data: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Login user with email and password"""
     # Find user by email
-    user = db.query(User).filter(User.email == login_data.email).first()
+    user = await db.scalar(select(User).where(User.email == login_data.email))
     if not user or not user.password_hash:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -263,11 +253,20 @@ async def login_user(login_data: LoginRequest, db: Session = Depends(get_db)):
         )
     
     # Verify password
-    if not verify_password(login_data.password, user.password_hash):
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(login_data.password, user.password_hash)
+    except PasswordHasherBusy:
+        raise password_hasher_busy_error()
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password"
         )
+
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
     
     # Create tokens
     access_token = create_access_token(data={"sub": user.id})
@@ -285,9 +284,9 @@ async def logout():
     return {"message": "Successfully logged out"}
 
 @router.get("/user/{user_id}", response_model=UserSchema)
-async def get_user_by_user_id(user_id: str, db: Session = Depends(get_db)):
+async def get_user_by_user_id(user_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get user profile by user_id"""
-    user = db.query(User).filter(User.user_id == user_id).first()
+    user = await db.scalar(select(User).where(User.user_id == user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -299,10 +298,10 @@ async def get_user_by_user_id(user_id: str, db: Session = Depends(get_db)):
 async def update_current_user(
     user_update: UserUpdate,
     current_user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user profile"""
-    user = db.query(User).filter(User.id == current_user_id).first()
+    user = await db.scalar(select(User).where(User.id == current_user_id))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -320,7 +319,8 @@ async def update_current_user(
     
     user.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_user(user.id)
     
     return user
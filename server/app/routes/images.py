@@ -1,117 +1,510 @@
-from fastapi import APIRouter, HTTPException, Depends, Form, status
-from sqlalchemy.orm import Session
-from app.database import get_db
+from fastapi import APIRouter, HTTPException, Depends, Form, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse, ORJSONResponse
+from sqlalchemy import select, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import TypeAdapter
+from app.database import get_async_db, AsyncSessionLocal
 from app.models.generated_image import GeneratedImage as GeneratedImageModel
-from app.models.user import User
-from app.schemas import GeneratedImageCreate, GeneratedImage as GeneratedImageSchema
-from app.services.image_service import generate_images, enhance_prompt
-from app.utils.auth import verify_access_token
+from app.models.generation_job import GenerationJob as GenerationJobModel
+from app.schemas import GeneratedImage as GeneratedImageSchema, GenerationJob as GenerationJobSchema, BatchGenerateRequest, BatchGenerateResponse
+from app.services.generation import run_generation_coalesced, stream_generation, find_existing_image, find_existing_images, run_generation_batch, BATCH_MAX_ITEMS
+from app.services.job_queue import generation_jobs, JobQueueFull
+from app.services.prompt_cache import normalize_prompt
+from app.services.blob_store import blob_store, is_valid_digest, resolve_image_url, BLOB_URL_PREFIX
+from app.services.derivatives import derivative_renderer, load_supported_formats, source_key_for_url, UndecodableImage, DERIVATIVE_SIZES, MEDIA_TYPES
+from app.services.http_client import get_http_client
+from app.utils.auth import verify_token_payload
+from app.utils.user_cache import get_user_identity
+from app.utils.rate_limit import generation_rate_limiter, RateLimitExceeded
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-import uuid
+import asyncio
+import httpx
 import json
+import base64
+import math
 from datetime import datetime
+from typing import Optional
 
 router = APIRouter()
 security = HTTPBearer()
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: AsyncSession = Depends(get_async_db)):
     """Get current user from access token"""
     token = credentials.credentials
-    user_id = verify_access_token(token)
-    if not user_id:
+    payload = verify_token_payload(token, "access")
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired access token",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get the user object to return the user_id field
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    # Look up the public user_id field for this account (cached for the token's remaining lifetime)
+    identity = await get_user_identity(db, payload["sub"], payload.get("exp"))
+    if not identity:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user.user_id
+    return identity.user_id
 
-@router.post("/generate", response_model=GeneratedImageSchema)
+def retry_after_seconds(retry_after: float) -> int:
+    return max(1, math.ceil(min(retry_after, 3600)))
+
+async def enforce_generation_rate_limit(user_id: str, cost: int = 1):
+    """Fail fast with 429 when the user's or the global generation budget is spent"""
+    try:
+        await generation_rate_limiter.check(user_id, cost)
+    except RateLimitExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many generation requests, please slow down",
+            headers={"Retry-After": str(retry_after_seconds(e.retry_after))}
+        )
+
+async def charge_generation(db: AsyncSession, user_id: str, prompt: str, force: bool) -> Optional[GeneratedImageModel]:
+    """
+    Charge the rate limiter only when a generation will actually run. Returns
+    the user's existing generation for the prompt instead, free, unless forced.
+    For requests that don't go through run_generation_coalesced, which charges
+    only the caller that starts a flight.
+    """
+    if not force:
+        existing = await find_existing_image(db, user_id, prompt)
+        if existing:
+            return existing
+    await enforce_generation_rate_limit(user_id)
+    return None
+
+@router.post(
+    "/generate",
+    response_model=GeneratedImageSchema,
+    responses={202: {"model": GenerationJobSchema, "description": "Job accepted (mode=async)"}}
+)
 async def generate_image(
     prompt: str = Form(...),
     category: str = Form(None),
     force: bool = Form(False),  # Add force parameter
+    mode: str = Form("sync"),  # "async" returns a job id right away
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    if mode not in ("sync", "async"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="mode must be 'sync' or 'async'"
+        )
+
+    if mode == "async":
+        await charge_generation(db, user_id, prompt, force)
+        try:
+            job = await generation_jobs.submit(db, user_id, prompt, category, force)
+        except JobQueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Generation queue is full, please retry shortly",
+                headers={"Retry-After": "5"}
+            )
+        return ORJSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=GenerationJobSchema.model_validate(job).model_dump(mode="json"),
+            headers={"Location": f"/api/images/jobs/{job.id}"}
+        )
+
+    async def charge():
+        await enforce_generation_rate_limit(user_id)
+
     try:
-        # Only check for existing images if not forcing regeneration
-        if not force:
-            existing_image = db.query(GeneratedImageModel).filter(
-                GeneratedImageModel.user_id == user_id,
-                GeneratedImageModel.original_prompt == prompt,
-                GeneratedImageModel.is_deleted == False
-            ).first()
-            
-            if existing_image:
-                print(f"Returning existing images for prompt: {prompt}")
-                return existing_image
-        
-        # Generate new images (limit to 4 images)
-        image_urls, enhanced_prompt = await generate_images(prompt, num_images=4)
-        
-        # Create database entry
-        image_data = GeneratedImageCreate(
-            user_id=user_id,
-            original_prompt=prompt,
-            enhanced_prompt=enhanced_prompt,  # Save the enhanced prompt
-            image_urls=image_urls,
-            category=category
-        )
-        
-        db_image = GeneratedImageModel(
-            id=str(uuid.uuid4()),
-            **image_data.dict(),
-            created_at=datetime.utcnow(),  # Explicitly set created_at
-            is_deleted=False  # Explicitly set is_deleted
-        )
-        db.add(db_image)
-        db.commit()
-        db.refresh(db_image)
-        
-        print(f"Created new images for prompt: {prompt}")
-        return db_image
+        # Joining a request already in flight is free; its starter was charged
+        return await run_generation_coalesced(user_id, prompt, category, force, before_generate=charge)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Image generation failed: {str(e)}"
         )
 
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+@router.post("/generate/stream")
+async def generate_image_stream(
+    prompt: str = Form(...),
+    category: str = Form(None),
+    force: bool = Form(False),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Generate images and stream progress as Server-Sent Events:
+    enhanced → image (one per variant, as each finishes) → complete, or error.
+    """
+    async with AsyncSessionLocal() as db:
+        await charge_generation(db, user_id, prompt, force)
+
+    async def events():
+        async with AsyncSessionLocal() as db:
+            try:
+                async for event, payload in stream_generation(db, user_id, prompt, category, force):
+                    if event == "enhanced":
+                        yield format_sse("enhanced", {"enhanced_prompt": payload})
+                    elif event == "image":
+                        index, url = payload
+                        yield format_sse("image", {"index": index, "url": resolve_image_url(url)})
+                    else:
+                        yield format_sse("complete", GeneratedImageSchema.model_validate(payload))
+            except Exception as e:
+                yield format_sse("error", {"detail": f"Image generation failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/generate/batch", response_model=BatchGenerateResponse)
+async def generate_image_batch(
+    request: BatchGenerateRequest,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Generate many prompts in one call. Prompts the user already generated
+    are returned as-is, repeated prompts are generated once (later repeats
+    report "existing"), and failures are reported per item instead of failing
+    the whole batch. Items beyond the user's generation rate limit come back
+    as "rate_limited".
+    """
+    if not request.items:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="items must not be empty")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can hold at most {BATCH_MAX_ITEMS} items"
+        )
+
+    prompts = [item.prompt for item in request.items]
+    existing = {} if request.force else await find_existing_images(db, user_id, prompts)
+
+    # One generation per distinct new prompt, compared normalized; the first
+    # item's prompt and category are used and the repeats share its result
+    pending: dict[str, tuple[int, str, Optional[str]]] = {}
+    for index, item in enumerate(request.items):
+        if item.prompt not in existing:
+            pending.setdefault(normalize_prompt(item.prompt), (index, item.prompt, item.category))
+
+    # Only new generations are charged, one token each, until the budget runs out
+    admitted = []
+    retry_after = None
+    for _, prompt, category in pending.values():
+        try:
+            await generation_rate_limiter.check(user_id)
+        except RateLimitExceeded as e:
+            retry_after = retry_after_seconds(e.retry_after)
+            break
+        admitted.append((prompt, category))
+    if pending and not admitted:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many generation requests, please slow down",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    generated = await run_generation_batch(db, user_id, admitted) if admitted else {}
+
+    results = []
+    for index, item in enumerate(request.items):
+        result = {"index": index, "prompt": item.prompt}
+        if item.prompt in existing:
+            result.update(status="existing", image=existing[item.prompt])
+        else:
+            first_index, prompt, _ = pending[normalize_prompt(item.prompt)]
+            outcome = generated.get(prompt)
+            if outcome is None:
+                result.update(status="rate_limited", retry_after=retry_after)
+            elif isinstance(outcome, Exception):
+                result.update(status="failed", error=f"Image generation failed: {str(outcome)}")
+            else:
+                result.update(status="created" if index == first_index else "existing", image=outcome)
+        results.append(result)
+
+    counts = {key: sum(1 for result in results if result["status"] == key) for key in ("created", "existing", "failed", "rate_limited")}
+    return {"results": results, **counts}
+
+@router.get("/jobs/{job_id}", response_model=GenerationJobSchema)
+async def get_generation_job(
+    job_id: str,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get the status of a background generation job"""
+    job = await db.scalar(select(GenerationJobModel).where(
+        GenerationJobModel.id == job_id,
+        GenerationJobModel.user_id == user_id
+    ))
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+
+    result = GenerationJobSchema.model_validate(job)
+    if job.image_id:
+        image = await db.get(GeneratedImageModel, job.image_id)
+        if image:
+            result.image = GeneratedImageSchema.model_validate(image)
+    return result
+
+def encode_history_cursor(image: GeneratedImageModel) -> str:
+    """Opaque keyset cursor pointing just past image"""
+    raw = json.dumps([image.created_at.isoformat(), image.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, image_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(image_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+# Validates ORM rows and encodes them to JSON bytes in one pass, without
+# building the intermediate dicts FastAPI's response_model path makes
+history_adapter = TypeAdapter(list[GeneratedImageSchema])
+
 @router.get("/history", response_model=list[GeneratedImageSchema])
 async def get_image_history(
     user_id: str = Depends(get_current_user),
     skip: int = 0,
     limit: int = 50,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get user's image generation history"""
-    images = db.query(GeneratedImageModel).filter(
+    """
+    Get user's image generation history, newest first.
+    Pass the X-Next-Cursor header from the previous page as cursor to page
+    with a stable keyset; skip is still honoured when no cursor is given.
+    """
+    # Matches ix_generated_images_user_history (user_id, is_deleted, created_at DESC, id)
+    query = select(GeneratedImageModel).where(
         GeneratedImageModel.user_id == user_id,
         GeneratedImageModel.is_deleted == False
-    ).order_by(GeneratedImageModel.created_at.desc()).offset(skip).limit(limit).all()
-    return images
+    ).order_by(GeneratedImageModel.created_at.desc(), GeneratedImageModel.id.asc())
+
+    if cursor:
+        created_at, image_id = decode_history_cursor(cursor)
+        query = query.where(or_(
+            GeneratedImageModel.created_at < created_at,
+            and_(GeneratedImageModel.created_at == created_at, GeneratedImageModel.id > image_id)
+        ))
+    elif skip:
+        query = query.offset(skip)
+
+    images = (await db.scalars(query.limit(limit))).all()
+    headers = {}
+    if images and len(images) == limit:
+        headers["X-Next-Cursor"] = encode_history_cursor(images[-1])
+    body = history_adapter.dump_json(history_adapter.validate_python(images, from_attributes=True))
+    return Response(content=body, media_type="application/json", headers=headers)
+
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Per-user derivatives: still immutable, but not for shared caches
+PRIVATE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def parse_byte_range(range_header: str, size: int) -> Optional[tuple[int, int]]:
+    """Parse a single 'bytes=' range into inclusive (start, end), or None if unsatisfiable"""
+    units, _, spec = range_header.partition("=")
+    if units.strip() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+DERIVATIVE_SOURCE_MAX_BYTES = 20 * 1024 * 1024
+
+async def choose_derivative_format(requested: Optional[str], accept: str) -> str:
+    formats = await load_supported_formats()
+    if requested:
+        if requested not in formats:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unsupported format, expected one of: {', '.join(formats)}"
+            )
+        return requested
+    return "avif" if "avif" in formats and "image/avif" in accept else "webp"
+
+async def serve_derivative(
+    request: Request,
+    source_key: str,
+    size: str,
+    fmt: Optional[str],
+    load_source,
+    cache_control: str = BLOB_CACHE_CONTROL
+):
+    """Render (once) and serve a resized copy of an image with long-lived cache headers"""
+    if size not in DERIVATIVE_SIZES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown size, expected one of: full, {', '.join(DERIVATIVE_SIZES)}"
+        )
+    fmt = await choose_derivative_format(fmt, request.headers.get("accept", ""))
+    etag = f'"{source_key}-{size}.{fmt}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        path = await derivative_renderer.get(source_key, size, fmt, load_source)
+    except UndecodableImage as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Could not decode source image: {str(e)}"
+        )
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=headers)
+
+async def fetch_remote_image(url: str) -> bytes:
+    """Download a source image, giving up as soon as it passes DERIVATIVE_SOURCE_MAX_BYTES"""
+    async with get_http_client().stream("GET", url) as response:
+        response.raise_for_status()
+        chunks = []
+        received = 0
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            if received > DERIVATIVE_SOURCE_MAX_BYTES:
+                raise ValueError("Source image is too large")
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+@router.get("/blobs/{digest}")
+async def get_blob(
+    digest: str,
+    request: Request,
+    size: str = "full",
+    format: Optional[str] = None
+):
+    """Stream a stored image blob with ETag and Range support, or a resized derivative"""
+    if not is_valid_digest(digest) or not blob_store.exists(digest):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Blob not found"
+        )
+
+    if size != "full":
+        async def load_source():
+            return blob_store.path_for(digest)
+        return await serve_derivative(request, digest, size, format, load_source)
+
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": BLOB_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    file_size, content_type = await asyncio.to_thread(
+        lambda: (blob_store.size(digest), blob_store.content_type(digest))
+    )
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = parse_byte_range(range_header, file_size)
+        if byte_range is None:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{file_size}"}
+            )
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            blob_store.iter_range(digest, start, end),
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=content_type,
+            headers=headers
+        )
+
+    headers["Content-Length"] = str(file_size)
+    return StreamingResponse(blob_store.iter_range(digest), media_type=content_type, headers=headers)
+
+@router.get("/{image_id}/derivatives/{index}")
+async def get_image_derivative(
+    image_id: str,
+    index: int,
+    request: Request,
+    size: str = "thumb",
+    format: Optional[str] = None,
+    user_id: str = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Serve a thumbnail or medium-size copy of one of the user's generated images"""
+    image_urls = await db.scalar(select(GeneratedImageModel.image_urls).where(
+        GeneratedImageModel.id == image_id,
+        GeneratedImageModel.user_id == user_id,
+        GeneratedImageModel.is_deleted == False
+    ))
+    urls = image_urls or []
+    if not 0 <= index < len(urls):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+
+    url = urls[index]
+    if url.startswith(BLOB_URL_PREFIX):
+        digest = url[len(BLOB_URL_PREFIX):]
+        if size == "full":
+            return RedirectResponse(resolve_image_url(url), status_code=status.HTTP_308_PERMANENT_REDIRECT)
+
+        async def load_source():
+            return blob_store.path_for(digest)
+        return await serve_derivative(request, digest, size, format, load_source, PRIVATE_CACHE_CONTROL)
+
+    if size == "full":
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+    async def load_source():
+        try:
+            return await fetch_remote_image(url)
+        except (httpx.HTTPError, ValueError) as e:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f"Could not fetch source image: {str(e)}"
+            )
+    return await serve_derivative(request, source_key_for_url(url), size, format, load_source, PRIVATE_CACHE_CONTROL)
 
 @router.delete("/{image_id}")
 async def delete_generated_image(
     image_id: str,
     user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Soft delete a generated image"""
-    image = db.query(GeneratedImageModel).filter(
+    image = await db.scalar(select(GeneratedImageModel).where(
         GeneratedImageModel.id == image_id,
         GeneratedImageModel.user_id == user_id
-    ).first()
+    ))
     
     if not image:
         raise HTTPException(
@@ -120,6 +513,6 @@ async def delete_generated_image(
         )
     
     image.is_deleted = True
-    db.commit()
+    await db.commit()
     
     return {"message": "Image deleted successfully"}
@@ -3,7 +3,7 @@
 from pydantic import BaseModel, field_validator
 from typing import List, Optional
 from datetime import datetime
-import json
+from app.services.blob_store import resolve_image_url
 
 # Import from user.py
 from .user import UserBase, UserCreate, UserUpdate, User, Token, TokenData, LoginRequest, OAuthCallbackRequest
@@ -31,13 +31,46 @@ class GeneratedImage(GeneratedImageBase):
 
     @field_validator('image_urls', mode='before')
     @classmethod
-    def parse_image_urls(cls, v):
-        if isinstance(v, str):
-            try:
-                return json.loads(v)
-            except json.JSONDecodeError:
-                return []
-        return v if isinstance(v, list) else []
+    def resolve_image_urls(cls, v):
+        # The column is native JSON, so rows arrive as lists already
+        return [resolve_image_url(url) for url in v] if isinstance(v, list) else []
+
+class GenerationJob(BaseModel):
+    id: str
+    status: str
+    prompt: str
+    category: Optional[str] = None
+    image_id: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    image: Optional[GeneratedImage] = None
+
+    class Config:
+        from_attributes = True
+
+class BatchGenerateItem(BaseModel):
+    prompt: str
+    category: Optional[str] = None
+
+class BatchGenerateRequest(BaseModel):
+    items: List[BatchGenerateItem]
+    force: bool = False
+
+class BatchGenerateResult(BaseModel):
+    index: int
+    prompt: str
+    status: str  # "existing", "created", "failed" or "rate_limited"
+    image: Optional[GeneratedImage] = None
+    error: Optional[str] = None
+    retry_after: Optional[int] = None
+
+class BatchGenerateResponse(BaseModel):
+    results: List[BatchGenerateResult]
+    created: int
+    existing: int
+    failed: int
+    rate_limited: int
 
 class GoogleAuthRequest(BaseModel):
     code: str
@@ -0,0 +1,104 @@
+# Content-addressed blob storage on local disk
+import os
+import re
+import asyncio
+import hashlib
+import tempfile
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", os.path.join(os.getcwd(), "blobs"))
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "http://localhost:8000").rstrip("/")
+BLOB_URL_PREFIX = "/api/images/blobs/"
+BLOB_CHUNK_SIZE = 64 * 1024
+
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF8", "image/gif"),
+]
+
+def is_valid_digest(digest: str) -> bool:
+    return bool(_DIGEST.match(digest))
+
+def blob_ref(digest: str) -> str:
+    """Short reference stored in the database in place of the image bytes"""
+    return f"{BLOB_URL_PREFIX}{digest}"
+
+def resolve_image_url(url: str) -> str:
+    """Expand a stored blob reference into an absolute URL for clients"""
+    if url.startswith(BLOB_URL_PREFIX):
+        return f"{PUBLIC_API_URL}{url}"
+    return url
+
+def sniff_content_type(head: bytes) -> str:
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypavif", b"ftypavis"):
+        return "image/avif"
+    return "application/octet-stream"
+
+class BlobStore:
+    """
+    Stores blobs under root/ab/cd/<sha256>. Writes are atomic and idempotent,
+    so concurrent writers of the same content are harmless.
+    """
+
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+
+    def path_for(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path_for(digest))
+
+    def put(self, data: bytes) -> str:
+        """Write data and return its sha256 digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return digest
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return digest
+
+    async def put_async(self, data: bytes) -> str:
+        return await asyncio.to_thread(self.put, data)
+
+    def size(self, digest: str) -> int:
+        return os.path.getsize(self.path_for(digest))
+
+    def content_type(self, digest: str) -> str:
+        with open(self.path_for(digest), "rb") as f:
+            return sniff_content_type(f.read(16))
+
+    def iter_range(self, digest: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Yield the bytes in [start, end] in chunks; end is inclusive"""
+        with open(self.path_for(digest), "rb") as f:
+            f.seek(start)
+            remaining = (end - start + 1) if end is not None else None
+            while remaining is None or remaining > 0:
+                chunk = f.read(BLOB_CHUNK_SIZE if remaining is None else min(BLOB_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+blob_store = BlobStore()
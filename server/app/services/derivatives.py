@@ -0,0 +1,130 @@
+# Thumbnail and derivative rendering
+import os
+import asyncio
+import hashlib
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union
+from dotenv import load_dotenv
+from app.services.blob_store import BLOB_STORE_DIR
+from app.utils.singleflight import SingleFlight
+
+load_dotenv()
+
+DERIVATIVE_DIR = os.getenv("DERIVATIVE_DIR", os.path.join(BLOB_STORE_DIR, "derivatives"))
+DERIVATIVE_WORKERS = int(os.getenv("DERIVATIVE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+DERIVATIVE_QUALITY = int(os.getenv("DERIVATIVE_QUALITY", "80"))
+
+DERIVATIVE_SIZES = {
+    "thumb": 128,
+    "medium": 256,
+}
+
+MEDIA_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+class UndecodableImage(Exception):
+    """The source isn't an image Pillow can (or is willing to) decode"""
+    pass
+
+def _render(source: Union[str, bytes], dst_path: str, max_side: int, fmt: str, quality: int):
+    """Runs in a worker process: resize source to fit max_side and save as fmt"""
+    from io import BytesIO
+    from PIL import Image
+
+    try:
+        with Image.open(source if isinstance(source, str) else BytesIO(source)) as opened:
+            image = opened.convert("RGBA" if opened.mode in ("RGBA", "LA", "P") else "RGB")
+    except (OSError, Image.DecompressionBombError) as e:
+        # OSError covers UnidentifiedImageError and truncated data
+        raise UndecodableImage(str(e)) from None
+    with image:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dst_path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                image.save(f, format=fmt.upper(), quality=quality)
+            os.replace(tmp_path, dst_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+_supported_formats: Optional[list[str]] = None
+
+def supported_formats() -> list[str]:
+    """Derivative formats this Pillow build can encode; probed once, then cached"""
+    global _supported_formats
+    if _supported_formats is None:
+        from PIL import Image, features
+        Image.init()
+        formats = []
+        if features.check("webp"):
+            formats.append("webp")
+        if "AVIF" in Image.SAVE:
+            formats.append("avif")
+        _supported_formats = formats
+    return _supported_formats
+
+async def load_supported_formats() -> list[str]:
+    """supported_formats(), probing Pillow off the event loop the first time"""
+    if _supported_formats is None:
+        return await asyncio.to_thread(supported_formats)
+    return _supported_formats
+
+def source_key_for_url(url: str) -> str:
+    """Derivatives of a remote image are stored under the sha256 of its URL"""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+class DerivativeRenderer:
+    """
+    Lazily renders resized copies of images on a process pool so Pillow never
+    runs on the event loop. Results are memoized on disk, and concurrent
+    requests for the same derivative share a single render.
+    """
+
+    def __init__(self, root: str = DERIVATIVE_DIR, workers: int = DERIVATIVE_WORKERS, quality: int = DERIVATIVE_QUALITY):
+        self.root = root
+        self.workers = workers
+        self.quality = quality
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._renders = SingleFlight()
+
+    def path_for(self, source_key: str, size: str, fmt: str) -> str:
+        return os.path.join(self.root, source_key[:2], source_key, f"{size}.{fmt}")
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def get(self, source_key: str, size: str, fmt: str, load_source) -> str:
+        """
+        Return the path of the derivative, rendering it first if needed.
+        load_source is an async callable returning a file path or the image bytes.
+        Raises UndecodableImage when the source can't be decoded.
+        """
+        path = self.path_for(source_key, size, fmt)
+        if os.path.exists(path):
+            return path
+
+        async def render():
+            source = await load_source()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _render, source, path, DERIVATIVE_SIZES[size], fmt, self.quality
+            )
+            return path
+
+        # The render runs as its own task, so a requester that disconnects
+        # doesn't cancel it for the others waiting on the same derivative
+        return await self._renders.do(path, render)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+derivative_renderer = DerivativeRenderer()
@@ -0,0 +1,252 @@
+# Generation pipeline shared by the sync, job, streaming and batch endpoints
+import os
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Optional, AsyncIterator, Any, Awaitable, Callable, Union
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.generated_image import GeneratedImage as GeneratedImageModel, compute_prompt_hash
+from app.schemas import GeneratedImageCreate
+from app.database import AsyncSessionLocal
+from app.services.image_service import generate_images, enhance_prompt, stream_images, emergency_image_urls
+from app.services.prompt_cache import normalize_prompt
+from app.utils.singleflight import SingleFlight
+from app.utils.metrics import DEDUP_QUERY_SECONDS, DB_INSERT_SECONDS
+from app.utils.log import get_logger, preview
+
+load_dotenv()
+
+logger = get_logger("generation")
+
+NUM_IMAGES = 4
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+# Prompts of one batch generated at the same time
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+async def find_existing_image(db: AsyncSession, user_id: str, prompt: str) -> Optional[GeneratedImageModel]:
+    """Return the user's live generation for exactly this prompt, if any"""
+    # Probe the (user_id, prompt_hash) index; the text comparison only confirms the match
+    with DEDUP_QUERY_SECONDS.time():
+        return await db.scalar(select(GeneratedImageModel).where(
+            GeneratedImageModel.user_id == user_id,
+            GeneratedImageModel.prompt_hash == compute_prompt_hash(prompt),
+            GeneratedImageModel.is_deleted == False,
+            GeneratedImageModel.original_prompt == prompt
+        ).limit(1))
+
+async def find_existing_images(db: AsyncSession, user_id: str, prompts: list[str]) -> dict[str, GeneratedImageModel]:
+    """find_existing_image for many prompts at once, in a single indexed query"""
+    with DEDUP_QUERY_SECONDS.time():
+        rows = (await db.scalars(select(GeneratedImageModel).where(
+            GeneratedImageModel.user_id == user_id,
+            GeneratedImageModel.prompt_hash.in_({compute_prompt_hash(prompt) for prompt in prompts}),
+            GeneratedImageModel.is_deleted == False
+        ))).all()
+    wanted = set(prompts)
+    existing = {}
+    for row in rows:
+        if row.original_prompt in wanted:
+            existing.setdefault(row.original_prompt, row)
+    return existing
+
+def build_generated_image(
+    user_id: str,
+    prompt: str,
+    category: Optional[str],
+    image_urls: list[str],
+    enhanced_prompt: str
+) -> GeneratedImageModel:
+    image_data = GeneratedImageCreate(
+        user_id=user_id,
+        original_prompt=prompt,
+        enhanced_prompt=enhanced_prompt,  # Save the enhanced prompt
+        image_urls=image_urls,
+        category=category
+    )
+
+    return GeneratedImageModel(
+        id=str(uuid.uuid4()),
+        **image_data.dict(),
+        created_at=datetime.utcnow(),  # Explicitly set created_at
+        is_deleted=False  # Explicitly set is_deleted
+    )
+
+async def save_generated_image(
+    db: AsyncSession,
+    user_id: str,
+    prompt: str,
+    category: Optional[str],
+    image_urls: list[str],
+    enhanced_prompt: str
+) -> GeneratedImageModel:
+    db_image = build_generated_image(user_id, prompt, category, image_urls, enhanced_prompt)
+    with DB_INSERT_SECONDS.time():
+        db.add(db_image)
+        await db.commit()
+        await db.refresh(db_image)
+    return db_image
+
+async def run_generation(
+    db: AsyncSession,
+    user_id: str,
+    prompt: str,
+    category: Optional[str] = None,
+    force: bool = False,
+    before_generate: Optional[Callable[[], Awaitable[Any]]] = None
+) -> GeneratedImageModel:
+    """
+    Dedup → enhance → generate → persist. before_generate runs only when a
+    generation is about to happen (e.g. to charge a rate limit) and may raise
+    to stop it.
+    """
+    # Only check for existing images if not forcing regeneration
+    if not force:
+        existing_image = await find_existing_image(db, user_id, prompt)
+        if existing_image:
+            logger.debug("Returning existing images", user_id=user_id, image_id=existing_image.id)
+            return existing_image
+
+    if before_generate is not None:
+        await before_generate()
+
+    # Generate new images (limit to 4 images)
+    image_urls, enhanced_prompt = await generate_images(prompt, num_images=NUM_IMAGES)
+    db_image = await save_generated_image(db, user_id, prompt, category, image_urls, enhanced_prompt)
+
+    logger.info("Created new images", user_id=user_id, image_id=db_image.id)
+    return db_image
+
+async def run_generation_batch(
+    db: AsyncSession,
+    user_id: str,
+    items: list[tuple[str, Optional[str]]]
+) -> dict[str, Union[GeneratedImageModel, Exception]]:
+    """
+    Enhance and generate every (prompt, category) concurrently, at most
+    BATCH_CONCURRENCY at a time, then persist all new rows with one commit.
+    If that commit fails the rows are saved one at a time, so a bad row only
+    fails its own item. Returns the new row, or the exception that stopped
+    it, per prompt.
+    """
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def generate(prompt: str):
+        async with slots:
+            return await generate_images(prompt, num_images=NUM_IMAGES)
+
+    outcomes = await asyncio.gather(*(generate(prompt) for prompt, _ in items), return_exceptions=True)
+
+    results = {}
+    rows = []
+    for (prompt, category), outcome in zip(items, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning("Batch generation failed", user_id=user_id, prompt=preview(prompt), error=str(outcome))
+            results[prompt] = outcome
+            continue
+        image_urls, enhanced_prompt = outcome
+        row = build_generated_image(user_id, prompt, category, image_urls, enhanced_prompt)
+        rows.append(row)
+        results[prompt] = row
+
+    if rows:
+        try:
+            # Primary keys are client-side, so this flushes as one multi-row INSERT
+            with DB_INSERT_SECONDS.time():
+                db.add_all(rows)
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.warning("Batch insert failed, saving rows one at a time", user_id=user_id, rows=len(rows), error=str(e))
+            rows = await save_rows_individually(db, user_id, rows, results)
+    logger.info("Batch generation finished", user_id=user_id, created=len(rows), requested=len(items))
+    return results
+
+async def save_rows_individually(
+    db: AsyncSession,
+    user_id: str,
+    rows: list[GeneratedImageModel],
+    results: dict[str, Union[GeneratedImageModel, Exception]]
+) -> list[GeneratedImageModel]:
+    """Commit each row on its own, recording failures in results; returns the rows saved"""
+    saved = []
+    for row in rows:
+        try:
+            with DB_INSERT_SECONDS.time():
+                db.add(row)
+                await db.commit()
+        except Exception as e:
+            await db.rollback()
+            logger.warning("Batch generation failed", user_id=user_id, prompt=preview(row.original_prompt), error=str(e))
+            results[row.original_prompt] = e
+            continue
+        # Detached, a later rollback can't expire the loaded attributes
+        db.expunge(row)
+        saved.append(row)
+    return saved
+
+generation_flights = SingleFlight()
+
+async def run_generation_coalesced(
+    user_id: str,
+    prompt: str,
+    category: Optional[str] = None,
+    force: bool = False,
+    before_generate: Optional[Callable[[], Awaitable[Any]]] = None
+) -> GeneratedImageModel:
+    """
+    run_generation with identical in-flight requests collapsed into one.
+    Double-clicks and client retries share the first call's result or error.
+    The shared call uses its own session so it outlives any single caller,
+    and only the caller that started it has its before_generate run.
+    """
+    # Forced regenerations only join other forced calls; a plain call may just
+    # return the existing image, which is not what a regeneration asked for
+    key = (user_id, normalize_prompt(prompt), category, force)
+
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await run_generation(db, user_id, prompt, category, force, before_generate)
+
+    return await generation_flights.do(key, run)
+
+async def stream_generation(
+    db: AsyncSession,
+    user_id: str,
+    prompt: str,
+    category: Optional[str] = None,
+    force: bool = False
+) -> AsyncIterator[tuple[str, Any]]:
+    """
+    Same pipeline as run_generation, but yields progress events as they happen:
+    ("enhanced", str), then ("image", (index, url)) per variant, then
+    ("complete", GeneratedImageModel).
+    """
+    if not force:
+        existing_image = await find_existing_image(db, user_id, prompt)
+        if existing_image:
+            logger.debug("Returning existing images", user_id=user_id, image_id=existing_image.id)
+            yield "complete", existing_image
+            return
+
+    enhanced_prompt = await enhance_prompt(prompt)
+    yield "enhanced", enhanced_prompt
+
+    image_urls = {}
+    try:
+        async for i, url in stream_images(enhanced_prompt, NUM_IMAGES):
+            image_urls[i] = url
+            yield "image", (i, url)
+    except Exception as e:
+        logger.error("Image generation failed completely", error=str(e))
+        # Emergency fallback for the variants that never arrived
+        for i, url in enumerate(emergency_image_urls(prompt, NUM_IMAGES)):
+            if i not in image_urls:
+                image_urls[i] = url
+                yield "image", (i, url)
+
+    ordered_urls = [image_urls[i] for i in sorted(image_urls)]
+    db_image = await save_generated_image(db, user_id, prompt, category, ordered_urls, enhanced_prompt)
+    logger.info("Created new images", user_id=user_id, image_id=db_image.id)
+    yield "complete", db_image
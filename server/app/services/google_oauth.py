@@ -0,0 +1,152 @@
+# Google OAuth code exchange and ID token verification
+import os
+import re
+import time
+import asyncio
+import httpx
+from dotenv import load_dotenv
+from jose import JWTError, jwt
+from typing import Optional
+from app.services.http_client import get_http_client
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("google_oauth")
+
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
+GOOGLE_REDIRECT_URI = os.getenv("GOOGLE_REDIRECT_URI", "http://localhost:3001/auth/callback")
+
+GOOGLE_AUTH_URL = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+GOOGLE_ISSUERS = ("https://accounts.google.com", "accounts.google.com")
+
+OAUTH_TIMEOUT_SECONDS = float(os.getenv("OAUTH_TIMEOUT_SECONDS", "10"))
+# Used when Google's response carries no Cache-Control max-age
+JWKS_DEFAULT_TTL_SECONDS = int(os.getenv("JWKS_DEFAULT_TTL_SECONDS", "3600"))
+# Unknown key ids force a refetch at most this often (keys rotate, forged kids shouldn't hammer Google)
+JWKS_MIN_REFRESH_SECONDS = 60
+
+class GoogleOAuthError(Exception):
+    pass
+
+def _max_age(response: httpx.Response) -> Optional[int]:
+    match = re.search(r"max-age=(\d+)", response.headers.get("cache-control", ""))
+    return int(match.group(1)) if match else None
+
+class JWKSCache:
+    """
+    Google's signing keys, cached for as long as the JWKS response allows.
+    A token signed with an unknown key id triggers one early refresh, since
+    that is what key rotation looks like from here.
+    """
+
+    def __init__(self, url: str = GOOGLE_JWKS_URL):
+        self.url = url
+        self._keys: dict[str, dict] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def _refresh(self):
+        response = await get_http_client().get(self.url, timeout=OAUTH_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        self._keys = {key["kid"]: key for key in response.json().get("keys", []) if "kid" in key}
+        self._fetched_at = time.monotonic()
+        self._expires_at = self._fetched_at + (_max_age(response) or JWKS_DEFAULT_TTL_SECONDS)
+
+    async def get_key(self, kid: str) -> Optional[dict]:
+        now = time.monotonic()
+        if now < self._expires_at and kid in self._keys:
+            return self._keys[kid]
+        async with self._lock:
+            # Another request may have refreshed while we waited
+            now = time.monotonic()
+            stale = now >= self._expires_at
+            unknown = kid not in self._keys and now - self._fetched_at >= JWKS_MIN_REFRESH_SECONDS
+            if stale or unknown:
+                await self._refresh()
+            return self._keys.get(kid)
+
+jwks_cache = JWKSCache()
+
+def authorization_url() -> str:
+    return (
+        f"{GOOGLE_AUTH_URL}?"
+        f"client_id={GOOGLE_CLIENT_ID}&"
+        "response_type=code&"
+        "scope=openid%20email%20profile&"
+        f"redirect_uri={GOOGLE_REDIRECT_URI}&"
+        "access_type=offline&"
+        "prompt=consent"
+    )
+
+async def exchange_code(code: str) -> dict:
+    """Trade an authorization code for Google's token response"""
+    response = await get_http_client().post(GOOGLE_TOKEN_URL, data={
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "code": code,
+        "grant_type": "authorization_code",
+        "redirect_uri": GOOGLE_REDIRECT_URI
+    }, timeout=OAUTH_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response.json()
+
+async def verify_id_token(id_token: str, access_token: Optional[str] = None) -> dict:
+    """Check the ID token's signature, audience, issuer and expiry locally; returns its claims"""
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except JWTError as e:
+        raise GoogleOAuthError(f"Malformed ID token: {str(e)}")
+    key = await jwks_cache.get_key(header.get("kid"))
+    if key is None:
+        raise GoogleOAuthError("ID token signed with an unknown key")
+    try:
+        return jwt.decode(
+            id_token,
+            key,
+            algorithms=[key.get("alg", "RS256")],
+            audience=GOOGLE_CLIENT_ID,
+            issuer=GOOGLE_ISSUERS,
+            access_token=access_token
+        )
+    except JWTError as e:
+        raise GoogleOAuthError(f"Invalid ID token: {str(e)}")
+
+async def fetch_userinfo(access_token: str) -> dict:
+    response = await get_http_client().get(
+        GOOGLE_USERINFO_URL,
+        headers={"Authorization": f"Bearer {access_token}"},
+        timeout=OAUTH_TIMEOUT_SECONDS
+    )
+    response.raise_for_status()
+    return response.json()
+
+async def get_google_profile(code: str) -> dict:
+    """
+    Exchange the code and return the user's profile in userinfo shape
+    (id, email, name, picture). Identity comes from the verified ID token;
+    the userinfo endpoint is only called when there is no ID token or its
+    keys can't be fetched.
+    """
+    token_data = await exchange_code(code)
+    id_token = token_data.get("id_token")
+    if id_token:
+        try:
+            claims = await verify_id_token(id_token, token_data.get("access_token"))
+        except httpx.HTTPError as e:
+            logger.warning("Google JWKS unavailable, falling back to userinfo", error=str(e))
+        else:
+            if not claims.get("email"):
+                raise GoogleOAuthError("ID token has no email claim")
+            return {
+                "id": claims["sub"],
+                "email": claims["email"],
+                "name": claims.get("name") or claims["email"].split("@")[0],
+                "picture": claims.get("picture")
+            }
+    return await fetch_userinfo(token_data["access_token"])
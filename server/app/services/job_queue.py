@@ -0,0 +1,232 @@
+# Background generation jobs
+import os
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import select, update, and_, func
+from app.database import AsyncSessionLocal
+from app.models.generation_job import GenerationJob
+from app.services.generation import run_generation_coalesced
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("job_queue")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", "256"))
+# A running job whose owner hasn't sent a heartbeat for this long is requeued
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+
+class JobQueueFull(Exception):
+    pass
+
+class GenerationJobQueue:
+    """
+    Bounded in-process worker pool for generation jobs. Job state lives in the
+    generation_jobs table. Running jobs carry their process's id and a
+    heartbeat, so with several uvicorn workers only jobs whose owner stopped
+    heartbeating are taken over. Queued jobs nobody claims within a lease
+    (left in a dead process's queue) are picked up the same way.
+    """
+
+    def __init__(
+        self,
+        workers: int = JOB_WORKERS,
+        max_size: int = JOB_QUEUE_MAX_SIZE,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        heartbeat_seconds: float = JOB_HEARTBEAT_SECONDS
+    ):
+        self.workers = workers
+        self.max_size = max_size
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+        # Ids sitting in this process's queue, so the sweep doesn't add them twice
+        self._pending: set[str] = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        # Reset interrupted jobs before any request can create new ones
+        job_ids = await self._recoverable_jobs()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain()))
+        if job_ids:
+            # Recovery may have more jobs than fit in the queue, so don't hold up startup
+            self._tasks.append(asyncio.create_task(self._requeue(job_ids)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _lease_expired(self):
+        """Running jobs whose owner has stopped heartbeating"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        last_seen = func.coalesce(GenerationJob.heartbeat_at, GenerationJob.updated_at, GenerationJob.created_at)
+        return and_(GenerationJob.status == GenerationJob.RUNNING, last_seen < cutoff)
+
+    def _unclaimed_too_long(self):
+        """Queued jobs nobody has claimed within a lease"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        queued_since = func.coalesce(GenerationJob.updated_at, GenerationJob.created_at)
+        return and_(GenerationJob.status == GenerationJob.QUEUED, queued_since < cutoff)
+
+    async def _reclaim_abandoned(self, db) -> list[str]:
+        """Move abandoned running jobs back to queued; returns the ids this call reset"""
+        job_ids = (await db.scalars(select(GenerationJob.id).where(self._lease_expired()))).all()
+        reset = []
+        for job_id in job_ids:
+            # Conditional on the lease still being expired, so two processes
+            # recovering at once don't both requeue the same job
+            result = await db.execute(update(GenerationJob).where(
+                GenerationJob.id == job_id, self._lease_expired()
+            ).values(status=GenerationJob.QUEUED, owner=None, heartbeat_at=None))
+            if result.rowcount == 1:
+                reset.append(job_id)
+        await db.commit()
+        return reset
+
+    async def _recoverable_jobs(self) -> list[str]:
+        """Queued jobs, plus running jobs whose lease expired (reset to queued)"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await self._reclaim_abandoned(db)
+                # Queued jobs may also sit in another process's queue; claiming
+                # is atomic, so whichever process gets there first runs them
+                job_ids = (await db.scalars(
+                    select(GenerationJob.id).where(
+                        GenerationJob.status == GenerationJob.QUEUED
+                    ).order_by(GenerationJob.created_at)
+                )).all()
+                return list(job_ids)
+        except Exception as e:
+            logger.error("Generation job recovery failed", error=str(e))
+            return []
+
+    async def _maintain(self):
+        """Heartbeat this process's running jobs and take over abandoned or stuck ones"""
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(update(GenerationJob).where(
+                        GenerationJob.status == GenerationJob.RUNNING,
+                        GenerationJob.owner == self.worker_id
+                    ).values(heartbeat_at=datetime.utcnow()))
+                    await db.commit()
+                    await self._reclaim_abandoned(db)
+                    # Reclaimed jobs last moved before the lease cutoff, so
+                    # they're swept up here too. Jobs a live peer still has
+                    # queued may be picked as well; claiming decides who runs them.
+                    job_ids = (await db.scalars(
+                        select(GenerationJob.id).where(
+                            self._unclaimed_too_long()
+                        ).order_by(GenerationJob.created_at)
+                    )).all()
+            except Exception as e:
+                logger.error("Generation job heartbeat failed", error=str(e))
+                continue
+            taken = 0
+            for job_id in job_ids:
+                if job_id in self._pending:
+                    continue
+                try:
+                    self._enqueue(job_id)
+                except asyncio.QueueFull:
+                    # Still queued in the database, so the next sweep retries
+                    break
+                taken += 1
+            if taken:
+                logger.info("Took over abandoned generation jobs", jobs=taken)
+
+    def _enqueue(self, job_id: str):
+        self._queue.put_nowait(job_id)
+        self._pending.add(job_id)
+
+    async def _requeue(self, job_ids: list[str]):
+        for job_id in job_ids:
+            # Recovered jobs wait for room rather than being dropped
+            self._pending.add(job_id)
+            await self._queue.put(job_id)
+        logger.info("Recovered unfinished generation jobs", jobs=len(job_ids))
+
+    async def submit(self, db, user_id: str, prompt: str, category: Optional[str], force: bool) -> GenerationJob:
+        """Persist a new job and hand it to the workers; raises JobQueueFull when saturated"""
+        if self._queue is None or self._queue.full():
+            raise JobQueueFull()
+        job = GenerationJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            prompt=prompt,
+            category=category,
+            force=force,
+            status=GenerationJob.QUEUED,
+            created_at=datetime.utcnow()
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        try:
+            self._enqueue(job.id)
+        except asyncio.QueueFull:
+            # The queue filled while the row was being committed. The caller
+            # gets 503, so the job must not run later on its own.
+            await self._set_status(db, job, GenerationJob.FAILED, error="Generation queue is full")
+            raise JobQueueFull()
+        return job
+
+    async def _set_status(self, db, job: GenerationJob, status: str, **values):
+        job.status = status
+        job.updated_at = datetime.utcnow()
+        for key, value in values.items():
+            setattr(job, key, value)
+        await db.commit()
+
+    async def _claim(self, db, job_id: str) -> bool:
+        """Atomically move a job from queued to running so it only runs once"""
+        result = await db.execute(update(GenerationJob).where(
+            GenerationJob.id == job_id,
+            GenerationJob.status == GenerationJob.QUEUED
+        ).values(
+            status=GenerationJob.RUNNING,
+            owner=self.worker_id,
+            heartbeat_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        ))
+        await db.commit()
+        return result.rowcount == 1
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            if not await self._claim(db, job_id):
+                return
+            job = await db.get(GenerationJob, job_id)
+            try:
+                image = await run_generation_coalesced(job.user_id, job.prompt, job.category, job.force)
+            except Exception as e:
+                await db.rollback()
+                logger.warning("Generation job failed", job_id=job_id, error=str(e))
+                await self._set_status(db, job, GenerationJob.FAILED, error=str(e))
+                return
+            await self._set_status(db, job, GenerationJob.SUCCEEDED, image_id=image.id)
+
+    async def _worker(self, index: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Generation worker error", worker=index, job_id=job_id)
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+generation_jobs = GenerationJobQueue()
@@ -0,0 +1,116 @@
+# Two-tier cache for Gemini-enhanced prompts
+import os
+import re
+import hashlib
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Optional
+from dotenv import load_dotenv
+from sqlalchemy import select, delete
+from app.database import AsyncSessionLocal
+from app.models.prompt_cache import EnhancedPromptCache
+from app.utils.cache import TTLCache
+from app.utils.metrics import cache_counters
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("prompt_cache")
+
+PROMPT_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "2048"))
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "3600"))
+PROMPT_CACHE_DB_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_DB_TTL_SECONDS", str(30 * 24 * 3600)))
+PROMPT_CACHE_PURGE_EVERY = int(os.getenv("PROMPT_CACHE_PURGE_EVERY", "500"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(prompt: str) -> str:
+    """Fold case, punctuation and whitespace so trivially different prompts share a key"""
+    folded = unicodedata.normalize("NFKC", prompt).casefold()
+    folded = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in folded)
+    return _WHITESPACE.sub(" ", folded).strip()
+
+def prompt_key(normalized: str) -> str:
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+class PromptCache:
+    """
+    In-process LRU/TTL tier in front of the enhanced_prompt_cache table.
+    The table makes entries survive restarts and shares them between workers.
+    """
+
+    def __init__(self, maxsize: int = PROMPT_CACHE_MAX_ENTRIES, ttl: float = PROMPT_CACHE_TTL_SECONDS, db_ttl: float = PROMPT_CACHE_DB_TTL_SECONDS):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.db_ttl = db_ttl
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._memory_hit_counter, self._db_hit_counter, self._miss_counter = cache_counters("prompt")
+        self._writes = 0
+
+    async def _db_get(self, key: str) -> Optional[str]:
+        async with AsyncSessionLocal() as db:
+            return await db.scalar(select(EnhancedPromptCache.enhanced_prompt).where(
+                EnhancedPromptCache.prompt_key == key,
+                EnhancedPromptCache.expires_at > datetime.utcnow()
+            ))
+
+    async def _db_set(self, key: str, normalized: str, enhanced: str, purge: bool):
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            await db.merge(EnhancedPromptCache(
+                prompt_key=key,
+                normalized_prompt=normalized,
+                enhanced_prompt=enhanced,
+                created_at=now,
+                expires_at=now + timedelta(seconds=self.db_ttl)
+            ))
+            if purge:
+                await db.execute(delete(EnhancedPromptCache).where(
+                    EnhancedPromptCache.expires_at <= now
+                ))
+            await db.commit()
+
+    async def get(self, prompt: str) -> Optional[str]:
+        key = prompt_key(normalize_prompt(prompt))
+        enhanced = self.memory.get(key)
+        if enhanced is not None:
+            self.memory_hits += 1
+            self._memory_hit_counter.inc()
+            return enhanced
+        try:
+            enhanced = await self._db_get(key)
+        except Exception as e:
+            logger.warning("Prompt cache lookup failed", error=str(e))
+            enhanced = None
+        if enhanced is None:
+            self.misses += 1
+            self._miss_counter.inc()
+            return None
+        self.db_hits += 1
+        self._db_hit_counter.inc()
+        self.memory.set(key, enhanced)
+        return enhanced
+
+    async def set(self, prompt: str, enhanced: str):
+        normalized = normalize_prompt(prompt)
+        key = prompt_key(normalized)
+        self.memory.set(key, enhanced)
+        self._writes += 1
+        purge = PROMPT_CACHE_PURGE_EVERY > 0 and self._writes % PROMPT_CACHE_PURGE_EVERY == 0
+        try:
+            await self._db_set(key, normalized, enhanced, purge)
+        except Exception as e:
+            logger.warning("Prompt cache write failed", error=str(e))
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+prompt_cache = PromptCache()
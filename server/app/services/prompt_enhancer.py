@@ -0,0 +1,116 @@
+# Gemini prompt enhancement engine
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.utils.circuit_breaker import get_breaker
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("prompt_enhancer")
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+ENHANCE_TIMEOUT_SECONDS = float(os.getenv("ENHANCE_TIMEOUT_SECONDS", "8"))
+ENHANCE_MAX_WORKERS = int(os.getenv("ENHANCE_MAX_WORKERS", "8"))
+# Point Gemini at another host (e.g. the benchmark stub); uses the REST transport
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+ENHANCE_INSTRUCTIONS = (
+    "You are an expert at creating detailed prompts for AI image generation. "
+    "Transform this user request into a highly detailed, vivid prompt that will produce the best possible image: '{prompt}'. "
+    "Include specific visual details, lighting, composition, style, colors, and atmosphere. "
+    "Make it suitable for photorealistic image generation. "
+    "Keep it under 200 words but be very descriptive. "
+    "Focus on creating a prompt that captures exactly what the user wants to see."
+)
+
+class PromptEnhancer:
+    """
+    Runs Gemini enhancement on a bounded thread pool so the event loop never
+    blocks. Calls that exceed the deadline fall back to the original prompt,
+    and while the circuit breaker is open Gemini isn't called at all.
+    """
+
+    def __init__(self, model_name: str = GEMINI_MODEL, timeout: float = ENHANCE_TIMEOUT_SECONDS, max_workers: int = ENHANCE_MAX_WORKERS):
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._model = None
+        self._executor = None
+        self._slots = None
+        self.breaker = get_breaker("enhancer:gemini")
+
+    def _get_model(self):
+        if self._model is None:
+            # The SDK takes a noticeable share of a second to import, so it's
+            # loaded here on first use instead of at worker start
+            import google.generativeai as genai
+            if GEMINI_API_ENDPOINT:
+                genai.configure(
+                    api_key=os.getenv("GEMINI_API_KEY"),
+                    transport="rest",
+                    client_options={"api_endpoint": GEMINI_API_ENDPOINT}
+                )
+            else:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gemini")
+        return self._executor
+
+    def _generate(self, prompt: str) -> str:
+        response = self._get_model().generate_content(ENHANCE_INSTRUCTIONS.format(prompt=prompt))
+        return response.text.strip() if response.text else prompt
+
+    async def _run(self, prompt: str) -> str:
+        # Waiting for a slot counts against the deadline, so work never piles
+        # up in the executor queue behind a slow Gemini. The slot is held until
+        # the thread finishes, not until the caller stops waiting: a timed-out
+        # call still occupies a worker thread.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(self._generate, prompt)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._slots.release))
+        return await asyncio.wrap_future(future)
+
+    async def warm_up(self):
+        """Load the Gemini SDK and build the model ahead of the first request"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._get_executor(), self._get_model)
+
+    async def enhance(self, prompt: str) -> str:
+        """Return the enhanced prompt, or the original prompt on failure, timeout or open breaker"""
+        if not self.breaker.allow():
+            return prompt
+        try:
+            enhanced = await asyncio.wait_for(self._run(prompt), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            logger.warning("Prompt enhancement missed its deadline, using original prompt", timeout=self.timeout)
+            return prompt
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.warning("Prompt enhancement failed, using original prompt", error=str(e))
+            return prompt
+        self.breaker.record_success()
+        return enhanced
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+prompt_enhancer = PromptEnhancer()
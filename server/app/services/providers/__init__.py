@@ -0,0 +1,8 @@
+# Pluggable image providers
+from app.services.providers.base import ImageProvider, ProviderError, ProviderStats, stable_seed
+from app.services.providers.registry import provider_registry, register_provider, load_plugins
+# Built-in providers register themselves on import
+from app.services.providers import imagen, pollinations, stock
+from app.services.providers.router import image_router, IMAGE_PROVIDER_PLUGINS
+
+load_plugins(IMAGE_PROVIDER_PLUGINS)
@@ -0,0 +1,95 @@
+# Image provider interface and rolling health stats
+import os
+import hashlib
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+from app.utils.circuit_breaker import get_breaker
+
+load_dotenv()
+
+PROVIDER_STATS_WINDOW = int(os.getenv("PROVIDER_STATS_WINDOW", "100"))
+
+# Provider tiers: real generators are always preferred over stock-photo fallbacks
+TIER_GENERATIVE = 0
+TIER_FALLBACK = 1
+
+class ProviderError(Exception):
+    pass
+
+def stable_seed(text: str, index: int, modulo: int) -> int:
+    """
+    Deterministic per-variant seed. Unlike hash(), this is identical on every
+    worker and across restarts, so generated URLs can be cached and shared.
+    """
+    digest = hashlib.sha256(f"{text}\x00{index}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % modulo
+
+class ProviderStats:
+    """Success rate and latency over a provider's last `window` calls"""
+
+    def __init__(self, window: int = PROVIDER_STATS_WINDOW):
+        self._calls: deque[tuple[bool, float]] = deque(maxlen=window)
+
+    def record(self, ok: bool, latency: float):
+        self._calls.append((ok, latency))
+
+    @property
+    def samples(self) -> int:
+        return len(self._calls)
+
+    def success_rate(self) -> Optional[float]:
+        if not self._calls:
+            return None
+        return sum(1 for ok, _ in self._calls if ok) / len(self._calls)
+
+    def latency_percentile(self, percentile: float) -> Optional[float]:
+        """Latency of successful calls at the given percentile (0-100), in seconds"""
+        latencies = sorted(latency for ok, latency in self._calls if ok)
+        if not latencies:
+            return None
+        rank = min(len(latencies) - 1, int(round(percentile / 100 * (len(latencies) - 1))))
+        return latencies[rank]
+
+    def snapshot(self) -> dict:
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        success_rate = self.success_rate()
+        return {
+            "samples": self.samples,
+            "success_rate": round(success_rate, 3) if success_rate is not None else None,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+        }
+
+class ImageProvider:
+    """
+    One image backend. Subclasses set `name` and implement generate(), which
+    returns the URL (or blob reference) of a single variant or raises.
+
+    tier       TIER_GENERATIVE for real generators, TIER_FALLBACK for stock photos
+    size       size label used in result cache keys
+    timeout    seconds a single generate() call may take
+    cacheable  whether results go into the cross-user result cache
+    """
+
+    name = ""
+    tier = TIER_GENERATIVE
+    size = "512x512"
+    timeout = 30.0
+    cacheable = True
+
+    def __init__(self):
+        self.stats = ProviderStats()
+        self.breaker = get_breaker(f"image:{self.name}")
+
+    async def available(self) -> bool:
+        """Whether the provider is configured and can be called at all"""
+        return True
+
+    async def warm_up(self):
+        """Load SDKs or open connections ahead of the first request"""
+        await self.available()
+
+    async def generate(self, enhanced_prompt: str, index: int) -> str:
+        raise NotImplementedError
@@ -0,0 +1,49 @@
+# Hedged provider requests
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "true").lower() in ("1", "true", "yes")
+# Hedge once a call has run longer than this percentile of the provider's recent latency
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+# "same": duplicate the call to the same provider; "next": send it to the next-ranked provider
+HEDGE_TARGET = os.getenv("HEDGE_TARGET", "same")
+# At most this many hedges per primary call over time, plus a small burst
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+HEDGE_BUDGET_BURST = float(os.getenv("HEDGE_BUDGET_BURST", "10"))
+
+class HedgeBudget:
+    """
+    Every primary call deposits `ratio` tokens (up to `burst`) and every
+    hedge spends one, so hedging can never add more than ratio × normal load
+    to a provider, even when the provider is slow across the board.
+    """
+
+    def __init__(self, ratio: float = HEDGE_BUDGET_RATIO, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+        self.sent = 0
+        self.won = 0
+        self.exhausted = 0
+
+    def deposit(self):
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.tokens < 1:
+            self.exhausted += 1
+            return False
+        self.tokens -= 1
+        self.sent += 1
+        return True
+
+    def snapshot(self) -> dict:
+        return {
+            "sent": self.sent,
+            "won": self.won,
+            "budget_exhausted": self.exhausted,
+            "tokens": round(self.tokens, 2),
+        }
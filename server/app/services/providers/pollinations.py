@@ -0,0 +1,37 @@
+# Pollinations AI (free, URL-addressed image generation)
+import os
+import urllib.parse
+import httpx
+from dotenv import load_dotenv
+from app.services.http_client import get_http_client
+from app.services.providers.base import ImageProvider, ProviderError, stable_seed
+from app.services.providers.registry import register_provider
+
+load_dotenv()
+
+POLLINATIONS_BASE_URL = os.getenv("POLLINATIONS_BASE_URL", "https://image.pollinations.ai")
+POLLINATIONS_DEADLINE_SECONDS = float(os.getenv("POLLINATIONS_DEADLINE_SECONDS", "30"))
+IMAGE_SIZE = 512
+
+def pollinations_url(enhanced_prompt: str, index: int) -> str:
+    encoded_prompt = urllib.parse.quote(enhanced_prompt)
+    # Add seed for variation while keeping it deterministic
+    seed = stable_seed(enhanced_prompt, index, 1000000)
+    return f"{POLLINATIONS_BASE_URL}/prompt/{encoded_prompt}?seed={seed}&width={IMAGE_SIZE}&height={IMAGE_SIZE}&nologo=true"
+
+@register_provider
+class PollinationsProvider(ImageProvider):
+    name = "pollinations"
+    size = f"{IMAGE_SIZE}x{IMAGE_SIZE}"
+    timeout = POLLINATIONS_DEADLINE_SECONDS
+
+    async def generate(self, enhanced_prompt: str, index: int) -> str:
+        """Check that Pollinations can serve the variant and return its URL"""
+        url = pollinations_url(enhanced_prompt, index)
+        try:
+            response = await get_http_client().head(url)
+        except httpx.HTTPError as e:
+            raise ProviderError(f"Pollinations AI failed for image {index+1}: {str(e)}")
+        if response.status_code != 200:
+            raise ProviderError(f"Pollinations returned status {response.status_code} for image {index+1}")
+        return url
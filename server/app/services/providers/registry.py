@@ -0,0 +1,42 @@
+# Image provider registry
+import importlib
+from typing import Optional
+from app.services.providers.base import ImageProvider
+from app.utils.log import get_logger
+
+logger = get_logger("providers.registry")
+
+class ProviderRegistry:
+    """Name → provider instance for every registered image backend"""
+
+    def __init__(self):
+        self._providers: dict[str, ImageProvider] = {}
+
+    def register(self, provider: ImageProvider):
+        if not provider.name:
+            raise ValueError(f"{type(provider).__name__} has no name")
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> Optional[ImageProvider]:
+        return self._providers.get(name)
+
+    def names(self) -> list[str]:
+        return list(self._providers)
+
+    def all(self) -> list[ImageProvider]:
+        return list(self._providers.values())
+
+provider_registry = ProviderRegistry()
+
+def register_provider(cls):
+    """Class decorator: instantiate the provider and add it to the registry"""
+    provider_registry.register(cls())
+    return cls
+
+def load_plugins(modules: list[str]):
+    """Import provider modules by dotted path; each registers itself on import"""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            logger.error("Failed to load image provider plugin", module=module, error=str(e))
@@ -0,0 +1,269 @@
+# Latency-aware routing across image providers
+import os
+import time
+import asyncio
+from typing import AsyncIterator
+from dotenv import load_dotenv
+from app.services.result_cache import result_cache
+from app.services.providers.base import ImageProvider, ProviderError, TIER_GENERATIVE, TIER_FALLBACK
+from app.services.providers.registry import ProviderRegistry, provider_registry
+from app.services.providers.hedging import HedgeBudget, HEDGE_REQUESTS, HEDGE_PERCENTILE, HEDGE_MIN_DELAY_MS, HEDGE_TARGET
+from app.utils.circuit_breaker import OPEN, CLOSED
+from app.utils.metrics import PROVIDER_CALL_SECONDS, STOCK_IMAGE_FALLBACKS
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("providers.router")
+
+def _env_list(name: str, default: str) -> list[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+# Enabled providers in priority order; anything not listed is never called
+IMAGE_PROVIDERS = _env_list("IMAGE_PROVIDERS", "imagen,pollinations,unsplash,picsum")
+# Extra provider modules to import, e.g. "mycompany.providers.dalle"
+IMAGE_PROVIDER_PLUGINS = _env_list("IMAGE_PROVIDER_PLUGINS", "")
+# "latency": fastest healthy provider first; "priority": IMAGE_PROVIDERS order only
+PROVIDER_ROUTING = os.getenv("PROVIDER_ROUTING", "latency")
+PROVIDER_MIN_SUCCESS_RATE = float(os.getenv("PROVIDER_MIN_SUCCESS_RATE", "0.5"))
+# Below this many samples a provider counts as healthy and untimed, so it gets tried
+PROVIDER_MIN_SAMPLES = int(os.getenv("PROVIDER_MIN_SAMPLES", "5"))
+
+class ProviderRouter:
+    """
+    Ranks the enabled providers for each request and generates every variant
+    from the best one, falling back down the ranking when a call fails or
+    times out. Generators always rank ahead of stock-photo fallbacks. Within
+    a tier, healthy providers come first; generators are then ordered by
+    median latency (with latency routing) and everything else by configured
+    priority.
+
+    A generator call still running after the hedge percentile of that
+    provider's recent latency gets a hedge: a duplicate call, either to the
+    same provider or to the next-ranked one. Whichever finishes first wins
+    and the other is cancelled. Hedges are limited by a HedgeBudget.
+    """
+
+    def __init__(
+        self,
+        registry: ProviderRegistry = provider_registry,
+        enabled: list[str] = IMAGE_PROVIDERS,
+        policy: str = PROVIDER_ROUTING,
+        min_success_rate: float = PROVIDER_MIN_SUCCESS_RATE,
+        min_samples: int = PROVIDER_MIN_SAMPLES,
+        hedging: bool = HEDGE_REQUESTS,
+        hedge_percentile: float = HEDGE_PERCENTILE,
+        hedge_target: str = HEDGE_TARGET
+    ):
+        self.registry = registry
+        self.enabled = enabled
+        self.policy = policy
+        self.min_success_rate = min_success_rate
+        self.min_samples = min_samples
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_target = hedge_target
+        self.hedge_budget = HedgeBudget()
+
+    def providers(self) -> list[ImageProvider]:
+        return [provider for provider in map(self.registry.get, self.enabled) if provider is not None]
+
+    def is_healthy(self, provider: ImageProvider) -> bool:
+        if provider.breaker.state == OPEN:
+            return False
+        if provider.stats.samples < self.min_samples:
+            return True
+        return provider.stats.success_rate() >= self.min_success_rate
+
+    def _rank_key(self, provider: ImageProvider) -> tuple:
+        latency = 0.0
+        # Fallbacks answer instantly, so latency says nothing about their quality
+        timed = provider.tier == TIER_GENERATIVE and provider.stats.samples >= self.min_samples
+        if self.policy == "latency" and timed:
+            latency = provider.stats.latency_percentile(50) or 0.0
+        return (provider.tier, not self.is_healthy(provider), latency, self.enabled.index(provider.name))
+
+    async def ranked(self) -> list[ImageProvider]:
+        """Available providers, best first"""
+        providers = [provider for provider in self.providers() if await provider.available()]
+        return sorted(providers, key=self._rank_key)
+
+    async def _call(self, provider: ImageProvider, enhanced_prompt: str, index: int) -> str:
+        """One timed provider call, recorded in the provider's stats and circuit breaker"""
+        started = time.perf_counter()
+        try:
+            url = await asyncio.wait_for(provider.generate(enhanced_prompt, index), timeout=provider.timeout)
+        except asyncio.CancelledError:
+            provider.breaker.release()
+            raise
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            provider.stats.record(False, elapsed)
+            provider.breaker.record_failure()
+            outcome = "timeout" if isinstance(e, asyncio.TimeoutError) else "error"
+            PROVIDER_CALL_SECONDS.labels(provider.name, outcome).observe(elapsed)
+            raise
+        elapsed = time.perf_counter() - started
+        provider.stats.record(True, elapsed)
+        provider.breaker.record_success()
+        PROVIDER_CALL_SECONDS.labels(provider.name, "ok").observe(elapsed)
+        return url
+
+    def _hedge_delay(self, provider: ImageProvider):
+        """Seconds to wait before hedging a call to provider, or None to not hedge"""
+        if not self.hedging or provider.tier != TIER_GENERATIVE or provider.stats.samples < self.min_samples:
+            return None
+        latency = provider.stats.latency_percentile(self.hedge_percentile)
+        if latency is None:
+            return None
+        return max(HEDGE_MIN_DELAY_MS / 1000, latency)
+
+    def _hedge_provider(self, provider: ImageProvider, providers: list[ImageProvider], tried: set[str]):
+        if self.hedge_target == "same":
+            candidates = [provider]
+        else:
+            candidates = [p for p in providers if p.name not in tried and p.tier == TIER_GENERATIVE]
+        for candidate in candidates:
+            # Never spend a half-open breaker's trial call on a hedge
+            if candidate.breaker.state == CLOSED:
+                return candidate
+        return None
+
+    async def _hedged_call(
+        self,
+        provider: ImageProvider,
+        enhanced_prompt: str,
+        index: int,
+        providers: list[ImageProvider],
+        tried: set[str]
+    ) -> tuple[ImageProvider, str]:
+        """Call provider, hedging once if it runs past its hedge delay; returns the winner"""
+        if provider.tier == TIER_GENERATIVE:
+            self.hedge_budget.deposit()
+        primary = asyncio.create_task(self._call(provider, enhanced_prompt, index))
+        attempts = {primary: provider}
+        try:
+            delay = self._hedge_delay(provider)
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                hedge_provider = None if done else self._hedge_provider(provider, providers, tried)
+                # Breaker first: a budget token is only taken for a hedge that is sent
+                if hedge_provider is not None and hedge_provider.breaker.allow() and self.hedge_budget.try_spend():
+                    tried.add(hedge_provider.name)
+                    logger.debug("Hedging provider call", image=index + 1, provider=hedge_provider.name, after_ms=round(delay * 1000))
+                    attempts[asyncio.create_task(self._call(hedge_provider, enhanced_prompt, index))] = hedge_provider
+
+            pending = set(attempts)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_budget.won += 1
+                        return attempts[task], task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancel the loser (or everything, if our caller went away)
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    async def generate_variant(self, enhanced_prompt: str, index: int, providers: list[ImageProvider]) -> tuple[int, ImageProvider, str]:
+        """Generate one variant, trying providers in ranked order"""
+        tried: set[str] = set()
+        for provider in providers:
+            if provider.name in tried:
+                continue
+            if not provider.breaker.allow():
+                # Known-bad backend: skip it without paying for its timeout
+                continue
+            tried.add(provider.name)
+            try:
+                winner, url = await self._hedged_call(provider, enhanced_prompt, index, providers, tried)
+            except asyncio.TimeoutError:
+                logger.warning("Provider missed its deadline", provider=provider.name, image=index + 1, timeout=provider.timeout)
+                continue
+            except Exception as e:
+                logger.warning("Provider call failed", provider=provider.name, image=index + 1, error=str(e))
+                continue
+            logger.debug("Generated image", image=index + 1, provider=winner.name)
+            if winner.tier == TIER_FALLBACK:
+                STOCK_IMAGE_FALLBACKS.inc()
+            return index, winner, url
+        raise ProviderError(f"All image providers failed for image {index+1}")
+
+    async def _cached(self, enhanced_prompt: str, num_images: int, providers: list[ImageProvider]) -> dict[int, str]:
+        """Variants already in the result cache, from the best-ranked provider that has them"""
+        found = {}
+        for provider in providers:
+            if len(found) == num_images:
+                break
+            if not provider.cacheable:
+                continue
+            cached = await result_cache.get_many(enhanced_prompt, provider.name, provider.size, num_images)
+            for i, url in cached.items():
+                found.setdefault(i, url)
+        return found
+
+    async def stream(self, enhanced_prompt: str, num_images: int) -> AsyncIterator[tuple[int, str]]:
+        """
+        Yield (index, url) for each variant as it finishes. Cached variants
+        come first; the rest are generated concurrently.
+        """
+        providers = await self.ranked()
+        if not providers:
+            raise ProviderError("No image providers are enabled")
+
+        cached = await self._cached(enhanced_prompt, num_images, providers)
+        for i in sorted(cached):
+            yield i, cached[i]
+        if len(cached) == num_images:
+            logger.debug("Serving images from the result cache", images=num_images)
+            return
+
+        logger.debug("Routing image generation", providers=[provider.name for provider in providers])
+        pending = {
+            asyncio.create_task(self.generate_variant(enhanced_prompt, i, providers))
+            for i in range(num_images) if i not in cached
+        }
+        generated: dict[str, dict[int, str]] = {}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    i, provider, url = task.result()
+                    if provider.cacheable:
+                        generated.setdefault(provider.name, {})[i] = url
+                    yield i, url
+        finally:
+            for task in pending:
+                task.cancel()
+
+        # Fallback images are not cached so the next request retries the generators
+        for name, urls in generated.items():
+            provider = self.registry.get(name)
+            await result_cache.set_many(enhanced_prompt, name, provider.size, urls)
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "hedging": {
+                "enabled": self.hedging,
+                "percentile": self.hedge_percentile,
+                "target": self.hedge_target,
+                **self.hedge_budget.snapshot()
+            },
+            "providers": {
+                provider.name: {
+                    "tier": "generative" if provider.tier == TIER_GENERATIVE else "fallback",
+                    "healthy": self.is_healthy(provider),
+                    "breaker": provider.breaker.state,
+                    **provider.stats.snapshot()
+                }
+                for provider in self.providers()
+            }
+        }
+
+image_router = ProviderRouter()
@@ -0,0 +1,48 @@
+# Stock-photo fallbacks used when no generator is available
+from app.services.providers.base import ImageProvider, TIER_FALLBACK, stable_seed
+from app.services.providers.registry import register_provider
+
+THEME_KEYWORDS = {
+    "baby": ["baby", "child", "infant", "toddler", "kid"],
+    "book": ["book", "reading", "study", "learn"],
+    "park": ["bench", "park", "outdoor", "sitting"],
+    "success": ["success", "business", "professional"],
+}
+
+def thematic_search_term(enhanced_prompt: str) -> str:
+    """Pick Unsplash search categories from the words in the prompt"""
+    prompt_lower = enhanced_prompt.lower()
+    categories = [
+        category for category, words in THEME_KEYWORDS.items()
+        if any(word in prompt_lower for word in words)
+    ]
+    return "+".join(categories) if categories else "lifestyle"
+
+def picsum_url(prompt: str, index: int) -> str:
+    return f"https://picsum.photos/512/512?random={stable_seed(prompt, index, 1000)}"
+
+@register_provider
+class UnsplashProvider(ImageProvider):
+    """Thematically relevant Unsplash photos"""
+
+    name = "unsplash"
+    tier = TIER_FALLBACK
+    timeout = 1.0
+    # Not cached, so the next request retries the real generators
+    cacheable = False
+
+    async def generate(self, enhanced_prompt: str, index: int) -> str:
+        seed = stable_seed(enhanced_prompt, index, 100000)
+        return f"https://source.unsplash.com/512x512/?{thematic_search_term(enhanced_prompt)}&sig={seed}"
+
+@register_provider
+class PicsumProvider(ImageProvider):
+    """Random placeholder photos; the last resort"""
+
+    name = "picsum"
+    tier = TIER_FALLBACK
+    timeout = 1.0
+    cacheable = False
+
+    async def generate(self, enhanced_prompt: str, index: int) -> str:
+        return picsum_url(enhanced_prompt, index)
@@ -0,0 +1,131 @@
+# Cross-user cache of provider results
+import os
+import hashlib
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from sqlalchemy import select, delete, or_
+from app.database import AsyncSessionLocal
+from app.models.generation_result import GenerationResult
+from app.utils.cache import TTLCache
+from app.utils.metrics import cache_counters
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("result_cache")
+
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "8192"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_DB_TTL_SECONDS = float(os.getenv("RESULT_CACHE_DB_TTL_SECONDS", str(7 * 24 * 3600)))
+RESULT_CACHE_PURGE_EVERY = int(os.getenv("RESULT_CACHE_PURGE_EVERY", "500"))
+
+def result_key(enhanced_prompt: str, provider: str, size: str, variant_index: int) -> str:
+    """Content address for one generated variant"""
+    material = "\x00".join([enhanced_prompt, provider, size, str(variant_index)])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResultCache:
+    """
+    Maps (enhanced prompt, provider, size, variant index) to a finished image URL.
+    Entries are shared by every user, so a prompt that one user already
+    generated is served to the next user without calling the provider.
+    Rows in the generation_results table expire after db_ttl and are purged
+    every RESULT_CACHE_PURGE_EVERY writes.
+    """
+
+    def __init__(self, maxsize: int = RESULT_CACHE_MAX_ENTRIES, ttl: float = RESULT_CACHE_TTL_SECONDS, db_ttl: float = RESULT_CACHE_DB_TTL_SECONDS):
+        self.memory = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.db_ttl = db_ttl
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self._memory_hit_counter, self._db_hit_counter, self._miss_counter = cache_counters("result")
+        self._writes = 0
+
+    async def _db_get_many(self, keys: list[str]) -> dict[str, str]:
+        async with AsyncSessionLocal() as db:
+            rows = await db.execute(select(GenerationResult.result_key, GenerationResult.image_url).where(
+                GenerationResult.result_key.in_(keys),
+                GenerationResult.expires_at > datetime.utcnow()
+            ))
+            return {key: url for key, url in rows}
+
+    async def _db_set_many(self, rows: list[dict], purge: bool):
+        async with AsyncSessionLocal() as db:
+            now = datetime.utcnow()
+            expires_at = now + timedelta(seconds=self.db_ttl)
+            for row in rows:
+                await db.merge(GenerationResult(**row, created_at=now, expires_at=expires_at))
+            if purge:
+                # Rows from before expiry was tracked have no expires_at
+                await db.execute(delete(GenerationResult).where(or_(
+                    GenerationResult.expires_at <= now,
+                    GenerationResult.expires_at.is_(None)
+                )))
+            await db.commit()
+
+    async def get_many(self, enhanced_prompt: str, provider: str, size: str, num_images: int) -> dict[int, str]:
+        """Return cached URLs by variant index for the variants that are cached"""
+        keys = {i: result_key(enhanced_prompt, provider, size, i) for i in range(num_images)}
+        found = {}
+        missing = {}
+        for i, key in keys.items():
+            url = self.memory.get(key)
+            if url is not None:
+                found[i] = url
+                self.memory_hits += 1
+                self._memory_hit_counter.inc()
+            else:
+                missing[key] = i
+
+        if missing:
+            try:
+                stored = await self._db_get_many(list(missing))
+            except Exception as e:
+                logger.warning("Result cache lookup failed", error=str(e))
+                stored = {}
+            for key, i in missing.items():
+                url = stored.get(key)
+                if url is not None:
+                    found[i] = url
+                    self.memory.set(key, url)
+                    self.db_hits += 1
+                    self._db_hit_counter.inc()
+                else:
+                    self.misses += 1
+                    self._miss_counter.inc()
+        return found
+
+    async def set_many(self, enhanced_prompt: str, provider: str, size: str, urls: dict[int, str]):
+        """Store provider results by variant index"""
+        if not urls:
+            return
+        rows = []
+        for i, url in urls.items():
+            key = result_key(enhanced_prompt, provider, size, i)
+            self.memory.set(key, url)
+            rows.append({
+                "result_key": key,
+                "provider": provider,
+                "size": size,
+                "variant_index": i,
+                "image_url": url,
+            })
+        self._writes += 1
+        purge = RESULT_CACHE_PURGE_EVERY > 0 and self._writes % RESULT_CACHE_PURGE_EVERY == 0
+        try:
+            await self._db_set_many(rows, purge)
+        except Exception as e:
+            logger.warning("Result cache write failed", error=str(e))
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+result_cache = ResultCache()
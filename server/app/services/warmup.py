@@ -0,0 +1,45 @@
+# Optional startup warmup
+import os
+import time
+import asyncio
+from dotenv import load_dotenv
+from app.services.http_client import get_http_client
+from app.services.prompt_enhancer import prompt_enhancer
+from app.services.providers import image_router
+from app.services.derivatives import load_supported_formats
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("warmup")
+
+# Off by default so workers come up as fast as possible; turn on where the
+# first request's latency matters more than startup time
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+async def _timed(name: str, step) -> tuple[str, float, str]:
+    started = time.perf_counter()
+    try:
+        await step()
+        outcome = "ok"
+    except Exception as e:
+        outcome = f"failed: {str(e)}"
+    return name, time.perf_counter() - started, outcome
+
+async def warm_up():
+    """
+    Load the provider SDKs and open shared clients ahead of the first request.
+    Every step is best effort: a failure here only means the first request
+    pays the cost instead.
+    """
+    async def http_client():
+        get_http_client()
+
+    results = await asyncio.gather(
+        _timed("http_client", http_client),
+        _timed("gemini", prompt_enhancer.warm_up),
+        _timed("pillow", load_supported_formats),
+        *(_timed(provider.name, provider.warm_up) for provider in image_router.providers()),
+    )
+    for name, elapsed, outcome in results:
+        logger.info("Warmup step finished", step=name, outcome=outcome, ms=round(elapsed * 1000))
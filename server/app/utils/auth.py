@@ -2,18 +2,79 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from typing import Optional
+from app.utils.log import get_logger
 
 load_dotenv()
 
+logger = get_logger("auth")
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY", "your-refresh-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost are flagged for rehash on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "16"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+class PasswordHasherBusy(Exception):
+    pass
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated bounded thread pool so it never blocks the
+    event loop. Requests beyond workers + max_queue are rejected right away
+    instead of queueing behind a login burst.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self._pending = 0
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._pending >= self.capacity:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Returns (valid, new_hash); new_hash is set when the stored hash should be replaced"""
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -32,7 +93,8 @@ def create_refresh_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str, token_type: str = "access"):
+def verify_token_payload(token: str, token_type: str = "access") -> Optional[dict]:
+    """Decode and validate a token, returning its claims or None"""
     try:
         if not token:
             return None
@@ -51,14 +113,18 @@ def verify_token(token: str, token_type: str = "access"):
         if exp and datetime.utcnow().timestamp() > exp:
             return None
 
-        return user_id
+        return payload
     except JWTError as e:
-        print(f"JWT verification error for {token_type} token: {str(e)}")
+        logger.debug("JWT verification failed", token_type=token_type, error=str(e))
         return None
-    except Exception as e:
-        print(f"Unexpected error in token verification: {str(e)}")
+    except Exception:
+        logger.exception("Unexpected error in token verification", token_type=token_type)
         return None
 
+def verify_token(token: str, token_type: str = "access"):
+    payload = verify_token_payload(token, token_type)
+    return payload.get("sub") if payload else None
+
 def verify_access_token(token: str):
     return verify_token(token, "access")
 
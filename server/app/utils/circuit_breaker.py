@@ -0,0 +1,148 @@
+# Circuit breakers for outbound dependencies
+import os
+import time
+from collections import deque
+from typing import Optional
+from dotenv import load_dotenv
+from app.utils.log import get_logger
+
+load_dotenv()
+
+logger = get_logger("circuit_breaker")
+
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv("BREAKER_COOLDOWN_SECONDS", "30"))
+BREAKER_HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and outcomes are recorded over a sliding time
+    window. Once the window has at least min_calls and the failure rate
+    reaches the threshold, the breaker opens.
+    Open: calls are rejected without touching the dependency until the
+    cooldown has passed.
+    Half-open: up to half_open_max_calls trial calls go through. One success
+    closes the breaker again, one failure reopens it for another cooldown.
+
+    Callers ask allow() before each call, then report exactly one of
+    record_success(), record_failure() or release() (call abandoned).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        window: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        cooldown: float = BREAKER_COOLDOWN_SECONDS,
+        half_open_max_calls: int = BREAKER_HALF_OPEN_MAX_CALLS
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CLOSED
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._outcomes: deque[tuple[float, bool]] = deque()
+        self._trials = 0
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] <= now - self.window:
+            self._outcomes.popleft()
+
+    def failure_rate(self) -> Optional[float]:
+        self._prune(time.monotonic())
+        if not self._outcomes:
+            return None
+        return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+    def _open(self, now: float):
+        logger.warning("Circuit breaker opened", breaker=self.name)
+        self.times_opened += 1
+        self.state = OPEN
+        self.opened_at = now
+        self._trials = 0
+
+    def _close(self):
+        logger.info("Circuit breaker closed", breaker=self.name)
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes.clear()
+        self._trials = 0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self._trials = 0
+        if self.state == HALF_OPEN:
+            if self._trials < self.half_open_max_calls:
+                self._trials += 1
+                return True
+        elif self.state == CLOSED:
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        if self.state == OPEN:
+            # A call that started before the breaker opened
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+            return
+        now = time.monotonic()
+        self._outcomes.append((now, True))
+        self._prune(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.state == OPEN:
+            return
+        if self.state == HALF_OPEN:
+            self._open(now)
+            return
+        self._outcomes.append((now, False))
+        self._prune(now)
+        if len(self._outcomes) >= self.min_calls and self.failure_rate() >= self.failure_rate_threshold:
+            self._open(now)
+
+    def release(self):
+        """The call was abandoned before it had an outcome"""
+        if self.state == HALF_OPEN and self._trials > 0:
+            self._trials -= 1
+
+    def snapshot(self) -> dict:
+        failure_rate = self.failure_rate()
+        snapshot = {
+            "state": self.state,
+            "failure_rate": round(failure_rate, 3) if failure_rate is not None else None,
+            "calls_in_window": len(self._outcomes),
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+        if self.state == OPEN:
+            snapshot["retry_in_seconds"] = round(max(0.0, self.opened_at + self.cooldown - time.monotonic()), 1)
+        return snapshot
+
+circuit_breakers: dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for a dependency, created on first use"""
+    breaker = circuit_breakers.get(name)
+    if breaker is None:
+        breaker = circuit_breakers[name] = CircuitBreaker(name)
+    return breaker
+
+def breaker_states() -> dict:
+    return {name: breaker.snapshot() for name, breaker in circuit_breakers.items()}
@@ -0,0 +1,114 @@
+# Queue-backed structured logging
+import os
+import sys
+import json
+import queue
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+# Share of DEBUG records kept; per-request debug lines are too many to keep all
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+ROOT_LOGGER = "stockly"
+_RESERVED = ("exc_info", "stack_info", "stacklevel", "extra")
+
+def preview(text: Optional[str], limit: int = 80) -> Optional[str]:
+    """Shorten user text (prompts can run to 200 words) for log fields"""
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit] + "…"
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    logger.info("Generated image", provider="pollinations", image=2)
+    Keyword arguments become structured fields. Level checks happen before
+    any of them are touched, so disabled levels cost almost nothing.
+    """
+
+    def process(self, msg, kwargs):
+        fields = {key: kwargs.pop(key) for key in list(kwargs) if key not in _RESERVED}
+        kwargs.setdefault("extra", {})["fields"] = fields
+        return msg, kwargs
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+class DebugSampler(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in getattr(record, "fields", {}).items())
+        line = f"{self.formatTime(record)} {record.levelname:<7} {record.name} {record.getMessage()} {fields}".rstrip()
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+class _PreparedQueueHandler(QueueHandler):
+    """Render tracebacks in the caller (they can't cross the queue) but leave formatting to the listener"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, debug_sample_rate: float = LOG_DEBUG_SAMPLE_RATE):
+    """
+    Route every stockly.* logger through an unbounded in-memory queue. The
+    event loop only enqueues records; a QueueListener thread formats them
+    and writes to stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    handler = _PreparedQueueHandler(log_queue)
+    handler.addFilter(DebugSampler(debug_sample_rate))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.setLevel(level)
+    root.handlers = [handler]
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
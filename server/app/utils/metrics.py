@@ -0,0 +1,70 @@
+# Prometheus metrics
+import os
+from prometheus_client import CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest, multiprocess
+
+# Stage timings run from milliseconds (cache, DB) to tens of seconds (providers)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_SECONDS = Histogram(
+    "stockly_http_request_duration_seconds",
+    "Time until the response starts, by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_SECONDS = Histogram(
+    "stockly_stage_duration_seconds",
+    "Time spent in each stage of the generation pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PROVIDER_CALL_SECONDS = Histogram(
+    "stockly_provider_call_duration_seconds",
+    "Image provider calls, by provider and outcome (ok, error, timeout)",
+    ["provider", "outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+
+FALLBACKS = Counter(
+    "stockly_fallbacks_total",
+    "Degraded results: original prompt used, stock photo served, or emergency images",
+    ["kind"],
+)
+
+CACHE_LOOKUPS = Counter(
+    "stockly_cache_lookups_total",
+    "Cache lookups by cache and result (memory_hit, db_hit, miss)",
+    ["cache", "result"],
+)
+
+RATE_LIMITED = Counter(
+    "stockly_rate_limited_total",
+    "Generation requests rejected by the rate limiter",
+)
+
+# Children are bound once so the hot path skips the label lookup
+ENHANCE_SECONDS = STAGE_SECONDS.labels("enhance")
+DEDUP_QUERY_SECONDS = STAGE_SECONDS.labels("dedup_query")
+DB_INSERT_SECONDS = STAGE_SECONDS.labels("db_insert")
+IMAGES_SECONDS = STAGE_SECONDS.labels("images")
+
+ENHANCE_FALLBACKS = FALLBACKS.labels("enhance_original_prompt")
+STOCK_IMAGE_FALLBACKS = FALLBACKS.labels("stock_image")
+EMERGENCY_FALLBACKS = FALLBACKS.labels("emergency_images")
+
+def cache_counters(cache: str):
+    """(memory_hit, db_hit, miss) counters for one cache"""
+    return tuple(CACHE_LOOKUPS.labels(cache, result) for result in ("memory_hit", "db_hit", "miss"))
+
+def render_metrics() -> bytes:
+    """
+    Exposition text for /metrics. With PROMETHEUS_MULTIPROC_DIR set (one
+    directory shared by all uvicorn workers) the samples of every worker
+    are merged; otherwise this process's registry is used.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
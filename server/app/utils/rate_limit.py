@@ -0,0 +1,155 @@
+# Token-bucket rate limiting for generation endpoints
+import os
+import math
+import time
+import sqlite3
+import asyncio
+import threading
+from typing import NamedTuple
+from dotenv import load_dotenv
+from app.utils.cache import TTLCache
+from app.utils.metrics import RATE_LIMITED
+
+load_dotenv()
+
+# "memory" limits each worker process on its own; "sqlite" shares buckets
+# between all workers on the host through RATE_LIMIT_SQLITE_PATH
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "./ratelimit.db")
+
+GENERATE_USER_RATE_PER_MINUTE = float(os.getenv("GENERATE_USER_RATE_PER_MINUTE", "10"))
+GENERATE_USER_BURST = float(os.getenv("GENERATE_USER_BURST", "5"))
+GENERATE_GLOBAL_RATE_PER_MINUTE = float(os.getenv("GENERATE_GLOBAL_RATE_PER_MINUTE", "300"))
+GENERATE_GLOBAL_BURST = float(os.getenv("GENERATE_GLOBAL_BURST", "50"))
+
+class Bucket(NamedTuple):
+    key: str
+    rate: float  # tokens per second
+    burst: float  # bucket capacity
+
+def _refill(tokens: float, updated: float, bucket: Bucket, now: float) -> float:
+    return min(bucket.burst, tokens + max(0.0, now - updated) * bucket.rate)
+
+def _wait_for(tokens: float, cost: float, bucket: Bucket) -> float:
+    return (cost - tokens) / bucket.rate if bucket.rate > 0 else math.inf
+
+class MemoryBackend:
+    """Buckets in process memory. A bucket that has been idle long enough to refill is dropped."""
+
+    def __init__(self, maxsize: int = 100000):
+        self._buckets = TTLCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+
+    async def acquire(self, buckets: list[Bucket], cost: float) -> float:
+        now = time.time()
+        with self._lock:
+            levels = []
+            for bucket in buckets:
+                tokens, updated = self._buckets.get(bucket.key, (bucket.burst, now))
+                levels.append(_refill(tokens, updated, bucket, now))
+            wait = max(_wait_for(tokens, cost, bucket) for tokens, bucket in zip(levels, buckets))
+            if wait > 0:
+                return wait
+            for tokens, bucket in zip(levels, buckets):
+                full_in = (bucket.burst - tokens + cost) / bucket.rate if bucket.rate > 0 else None
+                self._buckets.set(bucket.key, (tokens - cost, now), ttl=full_in)
+            return 0.0
+
+class SQLiteBackend:
+    """
+    Buckets in a SQLite file shared by every worker process on the host.
+    Each check is one BEGIN IMMEDIATE transaction, so concurrent workers
+    never both spend the same tokens.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_SQLITE_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _acquire(self, buckets: list[Bucket], cost: float) -> float:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                levels = []
+                for bucket in buckets:
+                    row = conn.execute(
+                        "SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (bucket.key,)
+                    ).fetchone()
+                    tokens, updated = row if row else (bucket.burst, now)
+                    levels.append(_refill(tokens, updated, bucket, now))
+                wait = max(_wait_for(tokens, cost, bucket) for tokens, bucket in zip(levels, buckets))
+                if wait <= 0:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                        [(bucket.key, tokens - cost, now) for tokens, bucket in zip(levels, buckets)]
+                    )
+                conn.execute("COMMIT")
+                return max(0.0, wait)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    async def acquire(self, buckets: list[Bucket], cost: float) -> float:
+        return await asyncio.to_thread(self._acquire, buckets, cost)
+
+class RateLimitExceeded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class GenerationRateLimiter:
+    """
+    A per-user bucket and a global bucket in front of generation. A request
+    is admitted only if both have enough tokens, and then both are charged,
+    so a rejected request never uses up anyone's quota.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        user_rate_per_minute: float = GENERATE_USER_RATE_PER_MINUTE,
+        user_burst: float = GENERATE_USER_BURST,
+        global_rate_per_minute: float = GENERATE_GLOBAL_RATE_PER_MINUTE,
+        global_burst: float = GENERATE_GLOBAL_BURST
+    ):
+        if backend is None:
+            backend = SQLiteBackend() if RATE_LIMIT_BACKEND == "sqlite" else MemoryBackend()
+        self.backend = backend
+        self.user_rate = user_rate_per_minute / 60
+        self.user_burst = user_burst
+        self.global_bucket = Bucket("generate:global", global_rate_per_minute / 60, global_burst)
+        self.admitted = 0
+        self.rejected = 0
+
+    async def check(self, user_id: str, cost: float = 1):
+        """Charge cost tokens to the user and global buckets; raises RateLimitExceeded"""
+        buckets = [Bucket(f"generate:user:{user_id}", self.user_rate, self.user_burst), self.global_bucket]
+        wait = await self.backend.acquire(buckets, cost)
+        if wait > 0:
+            self.rejected += 1
+            RATE_LIMITED.inc()
+            raise RateLimitExceeded(wait)
+        self.admitted += 1
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+generation_rate_limiter = GenerationRateLimiter()
@@ -0,0 +1,33 @@
+# In-flight request coalescing
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while a call
+    is in flight await the same result (or exception) instead of repeating
+    the work. The shared call runs as its own task, so one caller going away
+    doesn't cancel it for the others, and its key is removed as soon as it
+    finishes.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Nobody may be left awaiting; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,45 @@
+# Cached token-to-user resolution
+import os
+import time
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.user import User
+from app.utils.cache import TTLCache
+
+load_dotenv()
+
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))
+
+class UserIdentity(NamedTuple):
+    id: str
+    user_id: str
+
+user_identity_cache = TTLCache(maxsize=AUTH_CACHE_MAX_ENTRIES, ttl=AUTH_CACHE_TTL_SECONDS)
+
+async def get_user_identity(db: AsyncSession, account_id: str, expires_at: Optional[float] = None) -> Optional[UserIdentity]:
+    """
+    Resolve a token subject to the user's identity, using the database only on
+    a cache miss. Entries never outlive the token that resolved them.
+    """
+    identity = user_identity_cache.get(account_id)
+    if identity is not None:
+        return identity
+
+    row = (await db.execute(select(User.id, User.user_id).where(User.id == account_id))).first()
+    if row is None:
+        return None
+    identity = UserIdentity(id=row.id, user_id=row.user_id)
+
+    ttl = AUTH_CACHE_TTL_SECONDS
+    if expires_at is not None:
+        ttl = min(ttl, expires_at - time.time())
+    if ttl > 0:
+        user_identity_cache.set(account_id, identity, ttl=ttl)
+    return identity
+
+def invalidate_user(account_id: str):
+    """Drop a user from the cache after it is updated or deleted"""
+    user_identity_cache.delete(account_id)
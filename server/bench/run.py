@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Benchmark the API against local stub upstreams.
+Starts stub Gemini, Pollinations and Google OAuth servers and the app
+itself in this process (uvicorn on loopback, fresh SQLite database), then
+drives each scenario at the target concurrency and reports throughput and
+p50/p95/p99 latency. Results are saved under bench/results/ and compared
+with the latest run from a different commit with the same settings; a
+regression beyond --max-regression exits 1.
+
+The load generator, app and stubs share one interpreter, so the numbers
+are for comparing commits on the same machine, not for sizing production.
+
+Usage: python -m bench.run [--scenarios me,history,generate] [--concurrency 16] [--requests 200]
+                           [--gemini-latency-ms 400] [--pollinations-error-rate 0.05] ...
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import httpx
+import uvicorn
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(SERVER_DIR, "bench", "results")
+SCENARIOS = ["login", "me", "history", "generate", "oauth"]
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+# Distinct Google accounts the oauth scenario cycles through: first logins create users, later ones update them
+OAUTH_ACCOUNTS = 50
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class ServerThread:
+    """A uvicorn server on its own thread and event loop"""
+
+    def __init__(self, app, port: int):
+        self.port = port
+        self.server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", access_log=False
+        ))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "ServerThread":
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise SystemExit(f"Server on port {self.port} failed to start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+def configure_environment(stub_url: str, database_path: str, blob_dir: str):
+    """Point the app at the stubs; must run before anything imports app.*"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{database_path}",
+        "BLOB_STORE_DIR": blob_dir,
+        "GEMINI_API_ENDPOINT": stub_url,
+        "GEMINI_API_KEY": "bench",
+        "POLLINATIONS_BASE_URL": stub_url,
+        "GOOGLE_CLIENT_ID": "bench-client",
+        "GOOGLE_CLIENT_SECRET": "bench-secret",
+        "GOOGLE_TOKEN_URL": f"{stub_url}/token",
+        "GOOGLE_JWKS_URL": f"{stub_url}/certs",
+        "GOOGLE_USERINFO_URL": f"{stub_url}/userinfo",
+    })
+    # Tunables keep any value set by the caller
+    for name, value in {
+        "LOG_LEVEL": "WARNING",
+        "RATE_LIMIT_BACKEND": "memory",
+        "GENERATE_USER_RATE_PER_MINUTE": "1000000",
+        "GENERATE_USER_BURST": "1000000",
+        "GENERATE_GLOBAL_RATE_PER_MINUTE": "1000000",
+        "GENERATE_GLOBAL_BURST": "1000000",
+    }.items():
+        os.environ.setdefault(name, value)
+
+def create_schema():
+    from app.database import Base, engine
+    from app.models import user, generated_image, prompt_cache, generation_result, generation_job  # noqa: F401
+    Base.metadata.create_all(bind=engine)
+
+def seed_history(user_id: str, rows: int):
+    """Give the bench user a full history so /history pages are realistic"""
+    from app.database import SessionLocal
+    from app.services.generation import build_generated_image
+    started = datetime.now(timezone.utc)
+    with SessionLocal() as db:
+        for i in range(rows):
+            image = build_generated_image(
+                user_id,
+                f"seeded prompt {i}",
+                "bench",
+                [f"https://example.com/seed/{i}/{variant}.jpg" for variant in range(4)],
+                f"A highly detailed photograph of seeded prompt {i}, soft natural light"
+            )
+            image.created_at = started - timedelta(seconds=i)
+            db.add(image)
+        db.commit()
+
+async def create_bench_user(client: httpx.AsyncClient) -> str:
+    """Register the password user and return an access token"""
+    response = await client.post("/api/auth/register", json={
+        "email": BENCH_EMAIL, "password": BENCH_PASSWORD, "first_name": "Bench", "last_name": "User"
+    })
+    response.raise_for_status()
+    response = await client.post("/api/auth/login", json={"email": BENCH_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+def build_requests(token: str, run_id: str) -> dict:
+    """Scenario name → function(i) returning the i-th request's (method, path, kwargs)"""
+    auth = {"Authorization": f"Bearer {token}"}
+    return {
+        "login": lambda i: ("POST", "/api/auth/login", {"json": {"email": BENCH_EMAIL, "password": BENCH_PASSWORD}}),
+        "me": lambda i: ("GET", "/api/auth/me", {"headers": auth}),
+        "history": lambda i: ("GET", "/api/images/history", {"headers": auth, "params": {"limit": 50}}),
+        # Unique prompts, so every request misses the dedup and cache layers and reaches the stubs
+        "generate": lambda i: ("POST", "/api/images/generate", {
+            "headers": auth, "data": {"prompt": f"bench {run_id} prompt {i}", "category": "bench"}
+        }),
+        "oauth": lambda i: ("POST", "/api/auth/google/callback", {"json": {"code": f"bench-code-{i % OAUTH_ACCOUNTS}"}}),
+    }
+
+async def run_scenario(client: httpx.AsyncClient, make_request, total: int, concurrency: int, offset: int = 0) -> dict:
+    latencies = []
+    statuses = Counter()
+    next_index = iter(range(offset, offset + total))
+
+    async def worker():
+        for i in next_index:
+            method, path, kwargs = make_request(i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, **kwargs)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, statuses, elapsed)
+
+def percentile(ordered: list[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    rank = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(latencies: list[float], statuses: Counter, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+    return {
+        "requests": len(ordered),
+        "ok": ok,
+        "errors": len(ordered) - ok,
+        "statuses": dict(sorted(statuses.items())),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p95": round(percentile(ordered, 95) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2),
+        },
+    }
+
+def git_revision() -> dict:
+    def git(*args):
+        result = subprocess.run(["git", *args], cwd=SERVER_DIR, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+def save_results(results: dict) -> str:
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    path = os.path.join(RESULTS_DIR, f"{stamp}-{results['commit'] or 'nogit'}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+def find_baseline(results: dict, exclude: str):
+    """Latest saved run from another commit with the same settings"""
+    if not os.path.isdir(RESULTS_DIR):
+        return None
+    for name in sorted(os.listdir(RESULTS_DIR), reverse=True):
+        path = os.path.join(RESULTS_DIR, name)
+        if path == exclude or not name.endswith(".json"):
+            continue
+        with open(path) as f:
+            candidate = json.load(f)
+        if candidate.get("commit") != results["commit"] and candidate.get("config") == results["config"]:
+            return path
+    return None
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """Scenarios whose p95 rose, or whose throughput fell, by more than max_regression"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        p95_before, p95_now = before["latency_ms"]["p95"], current["latency_ms"]["p95"]
+        if p95_before and p95_now > p95_before * (1 + max_regression):
+            regressions.append(f"{name}: p95 {p95_before:.1f} → {p95_now:.1f} ms")
+        rps_before, rps_now = before["throughput_rps"], current["throughput_rps"]
+        if rps_before and rps_now < rps_before * (1 - max_regression):
+            regressions.append(f"{name}: throughput {rps_before:.1f} → {rps_now:.1f} req/s")
+    return regressions
+
+def print_report(results: dict):
+    print(f"\n{'scenario':<10} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, summary in results["scenarios"].items():
+        latency = summary["latency_ms"]
+        print(
+            f"{name:<10} {summary['requests']:>6} {summary['errors']:>6} {summary['throughput_rps']:>8.1f} "
+            f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {latency['max']:>9.1f}"
+        )
+        if summary["errors"]:
+            print(f"{'':<10} statuses: {summary['statuses']}")
+
+async def drive(app_url: str, args, run_id: str) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=args.timeout) as client:
+        token = await create_bench_user(client)
+        response = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {token}"})
+        response.raise_for_status()
+        seed_history(response.json()["user_id"], args.history_rows)
+
+        requests = build_requests(token, run_id)
+        scenarios = {}
+        for name in args.scenarios:
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}", flush=True)
+            # Warmup requests use their own indices so they never pre-fill caches for the measured ones
+            await run_scenario(client, requests[name], args.warmup, args.concurrency, offset=10**6)
+            scenarios[name] = await run_scenario(client, requests[name], args.requests, args.concurrency)
+        return scenarios
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against local stub upstreams")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    parser.add_argument("--history-rows", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60)
+    for stub, latency in (("gemini", 400), ("pollinations", 150), ("oauth", 80)):
+        parser.add_argument(f"--{stub}-latency-ms", type=float, default=latency)
+        parser.add_argument(f"--{stub}-jitter-ms", type=float, default=latency / 2)
+        parser.add_argument(f"--{stub}-error-rate", type=float, default=0.0)
+    parser.add_argument("--baseline", help="Results file to compare against (default: latest run from another commit)")
+    parser.add_argument("--max-regression", type=float, default=0.2,
+                        help="Allowed relative rise in p95 / drop in throughput before failing")
+    parser.add_argument("--no-save", action="store_true", help="Don't write a results file")
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.path.insert(0, SERVER_DIR)
+    from bench.stubs import StubBehaviour, create_stub_app
+
+    behaviours = {
+        stub: StubBehaviour(
+            getattr(args, f"{stub}_latency_ms"), getattr(args, f"{stub}_jitter_ms"), getattr(args, f"{stub}_error_rate")
+        )
+        for stub in ("gemini", "pollinations", "oauth")
+    }
+    stub_app = create_stub_app(behaviours["gemini"], behaviours["pollinations"], behaviours["oauth"])
+    stubs = ServerThread(stub_app, free_port()).start()
+
+    workdir = tempfile.mkdtemp(prefix="stockly-bench-")
+    configure_environment(stubs.url, os.path.join(workdir, "bench.db"), os.path.join(workdir, "blobs"))
+    create_schema()
+    from app.main import app
+    server = ServerThread(app, free_port()).start()
+
+    run_id = uuid.uuid4().hex[:8]
+    try:
+        scenarios = asyncio.run(drive(server.url, args, run_id))
+    finally:
+        server.stop()
+        stubs.stop()
+
+    results = {
+        **git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "history_rows": args.history_rows,
+            "stubs": {stub: vars(behaviour) for stub, behaviour in behaviours.items()},
+        },
+        "stub_calls": dict(stub_app.state.counts),
+        "scenarios": scenarios,
+    }
+    print_report(results)
+
+    saved = None
+    if not args.no_save:
+        saved = save_results(results)
+        print(f"\nSaved {os.path.relpath(saved, SERVER_DIR)}")
+
+    baseline_path = args.baseline or find_baseline(results, exclude=saved)
+    if baseline_path is None:
+        return
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if baseline.get("config") != results["config"]:
+        print(f"Baseline {os.path.basename(baseline_path)} used different settings; not comparing")
+        return
+    regressions = compare(results, baseline, args.max_regression)
+    if regressions:
+        print(f"\n❌ Regressions against {baseline.get('commit')} ({os.path.basename(baseline_path)}):")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"✅ No regressions beyond {args.max_regression:.0%} against {baseline.get('commit')}")
+
+if __name__ == "__main__":
+    main()
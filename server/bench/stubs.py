@@ -0,0 +1,153 @@
+# Local stand-ins for Gemini, Pollinations and Google OAuth
+import re
+import time
+import random
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI, Form, Request, Response
+from fastapi.responses import JSONResponse
+from jose import jwk, jwt
+
+STUB_CLIENT_ID = "bench-client"
+STUB_KEY_ID = "bench-key"
+STUB_ISSUER = "https://accounts.google.com"
+
+# JPEG markers around filler; nothing in the benchmark decodes the body
+STUB_IMAGE = b"\xff\xd8\xff\xe0" + bytes(4096) + b"\xff\xd9"
+
+@dataclass
+class StubBehaviour:
+    """How one stub responds: base latency plus uniform jitter, and a share of 503s"""
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    error_rate: float = 0
+
+    async def delay(self):
+        seconds = (self.latency_ms + random.uniform(0, self.jitter_ms)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def fails(self) -> bool:
+        return random.random() < self.error_rate
+
+def _unavailable() -> JSONResponse:
+    return JSONResponse(status_code=503, content={"error": {"code": 503, "message": "stub failure"}})
+
+def _signing_key() -> tuple[str, dict]:
+    """A fresh RSA key: (PEM private key, public JWK)"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update(kid=STUB_KEY_ID, use="sig", alg="RS256")
+    return private_pem, public_jwk
+
+def stub_profile(code: str) -> dict:
+    """The Google account an authorization code logs in as; equal codes are the same account"""
+    subject = hashlib.sha256(code.encode()).hexdigest()[:16]
+    return {
+        "id": subject,
+        "email": f"bench-{subject}@example.com",
+        "name": f"Bench User{subject[:4]}",
+        "picture": None,
+    }
+
+def create_stub_app(gemini: StubBehaviour, pollinations: StubBehaviour, oauth: StubBehaviour) -> FastAPI:
+    """
+    One app serving all three upstreams, each on its real path:
+      POST /v1beta/models/{model}:generateContent  Gemini (REST transport)
+      GET|HEAD /prompt/{prompt}                    Pollinations
+      POST /token, GET /certs, GET /userinfo       Google OAuth
+    """
+    app = FastAPI(openapi_url=None)
+    private_pem, public_jwk = _signing_key()
+    counts = {"gemini": 0, "pollinations": 0, "oauth": 0}
+    profiles = {}  # access token → profile, for /userinfo
+    app.state.counts = counts
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def generate_content(model: str, request: Request):
+        counts["gemini"] += 1
+        await gemini.delay()
+        if gemini.fails():
+            return _unavailable()
+        body = await request.json()
+        instructions = body["contents"][0]["parts"][0]["text"]
+        # The enhancer quotes the user's prompt inside its instructions
+        quoted = re.search(r"'(.+?)'", instructions)
+        prompt = quoted.group(1) if quoted else instructions[:120]
+        text = f"A highly detailed photograph of {prompt}, soft natural light, shallow depth of field"
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": len(instructions) // 4, "candidatesTokenCount": len(text) // 4},
+        }
+
+    @app.api_route("/prompt/{prompt:path}", methods=["GET", "HEAD"])
+    async def pollinations_image(prompt: str, request: Request):
+        counts["pollinations"] += 1
+        await pollinations.delay()
+        if pollinations.fails():
+            return Response(status_code=503)
+        body = b"" if request.method == "HEAD" else STUB_IMAGE
+        return Response(body, media_type="image/jpeg", headers={"Content-Length": str(len(STUB_IMAGE))})
+
+    @app.post("/token")
+    async def token(code: str = Form(...), client_id: str = Form(None)):
+        counts["oauth"] += 1
+        await oauth.delay()
+        if oauth.fails():
+            return _unavailable()
+        profile = stub_profile(code)
+        access_token = f"stub-access-{profile['id']}-{time.monotonic_ns()}"
+        profiles[access_token] = profile
+        now = int(time.time())
+        id_token = jwt.encode(
+            {
+                "iss": STUB_ISSUER,
+                "aud": client_id or STUB_CLIENT_ID,
+                "sub": profile["id"],
+                "email": profile["email"],
+                "email_verified": True,
+                "name": profile["name"],
+                "iat": now,
+                "exp": now + 3600,
+            },
+            private_pem,
+            algorithm="RS256",
+            headers={"kid": STUB_KEY_ID},
+            access_token=access_token
+        )
+        return {"access_token": access_token, "id_token": id_token, "token_type": "Bearer", "expires_in": 3599}
+
+    @app.get("/certs")
+    async def certs():
+        counts["oauth"] += 1
+        await oauth.delay()
+        return JSONResponse({"keys": [public_jwk]}, headers={"Cache-Control": "public, max-age=3600"})
+
+    @app.get("/userinfo")
+    async def userinfo(request: Request):
+        counts["oauth"] += 1
+        await oauth.delay()
+        if oauth.fails():
+            return _unavailable()
+        profile = profiles.get(request.headers.get("authorization", "").removeprefix("Bearer "))
+        if profile is None:
+            return JSONResponse(status_code=401, content={"error": "invalid_token"})
+        return profile
+
+    return app
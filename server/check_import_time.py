@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Import-time budget check for the API.
+Imports app.main in a fresh interpreter with -X importtime, reports the
+slowest modules and fails if the import is over budget or pulled in one of
+the provider SDKs that are supposed to load lazily.
+
+Usage: python check_import_time.py [--budget-ms 1500] [--runs 3] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Loaded on first use (or by WARMUP_ON_STARTUP), never at import
+LAZY_MODULES = [
+    "google.cloud.aiplatform",
+    "vertexai",
+    "google.generativeai",
+    "PIL",
+]
+
+PROBE = (
+    "import sys, json, app.main; "
+    f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+)
+
+def measure():
+    """Return (cumulative microseconds for app.main, per-module self times, eagerly loaded lazy modules)"""
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=server_dir)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=server_dir, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit("Importing app.main failed")
+
+    total = None
+    self_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        self_times.append((int(self_us), name.strip()))
+        if name.strip() == "app.main":
+            total = int(cumulative_us)
+    eager = json.loads(result.stdout.strip().splitlines()[-1])
+    return total, self_times, eager
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500")))
+    parser.add_argument("--runs", type=int, default=3, help="best of N runs is compared to the budget")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    total, self_times, eager = min(runs, key=lambda run: run[0])
+    total_ms = total / 1000
+
+    print(f"import app.main: {total_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print("Slowest modules by self time:")
+    for self_us, name in sorted(self_times, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+
+    ok = True
+    if eager:
+        print(f"❌ Loaded at import time but should be lazy: {', '.join(eager)}")
+        ok = False
+    if total_ms > args.budget_ms:
+        print(f"❌ Import time over budget by {total_ms - args.budget_ms:.0f} ms")
+        ok = False
+    if ok:
+        print("✅ Import time within budget")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,12 @@ Creates all database tables
 from app.database import engine, Base
 from app.models.user import User
 from app.models.generated_image import GeneratedImage
+from app.models.prompt_cache import EnhancedPromptCache
+from app.models.generation_result import GenerationResult
+from app.models.generation_job import GenerationJob
 from sqlalchemy import text
+from alembic import command
+from alembic.config import Config
 
 def init_database():
     """Initialize database tables"""
@@ -17,15 +22,23 @@ def init_database():
         # Drop existing tables if they exist (for development)
         print("Dropping existing tables...")
         with engine.connect() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS generation_jobs"))
+            conn.execute(text("DROP TABLE IF EXISTS generation_results"))
+            conn.execute(text("DROP TABLE IF EXISTS enhanced_prompt_cache"))
             conn.execute(text("DROP TABLE IF EXISTS generated_images"))
             conn.execute(text("DROP TABLE IF EXISTS users"))
             conn.commit()
         
         Base.metadata.create_all(bind=engine)
+        # The tables match the latest migration, so later upgrades start from there
+        command.stamp(Config("alembic.ini"), "head", purge=True)
         print("✅ Database tables created successfully!")
         print("\nCreated tables:")
         print("- users")
         print("- generated_images")
+        print("- enhanced_prompt_cache")
+        print("- generation_results")
+        print("- generation_jobs")
     except Exception as e:
         print(f"❌ Failed to create database tables: {e}")
         print("\nMake sure:")
@@ -0,0 +1,42 @@
+# Point the app at a throwaway SQLite database and blob store before any app
+# module is imported; app.database and the services read these at import
+import os
+import atexit
+import shutil
+import asyncio
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="stockly-tests-")
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["BLOB_STORE_DIR"] = os.path.join(_workdir, "blobs")
+os.environ["RATE_LIMIT_BACKEND"] = "memory"
+os.environ.pop("DB_CREATE_ALL", None)
+
+import pytest
+from app.database import Base, engine, async_engine
+from app.models.user import User
+from app.models.generated_image import GeneratedImage
+from app.models.prompt_cache import EnhancedPromptCache
+from app.models.generation_result import GenerationResult
+from app.models.generation_job import GenerationJob
+
+@pytest.fixture(autouse=True)
+def fresh_database():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    yield
+
+@pytest.fixture
+def run():
+    """Run a coroutine on a new event loop, releasing pooled async connections afterwards"""
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                # aiosqlite connections belong to the loop that opened them
+                await async_engine.dispose()
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,84 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routes import images
+from app.routes.images import parse_byte_range
+from app.services.blob_store import blob_store, BLOB_CHUNK_SIZE
+
+PNG_HEADER = b"\x89PNG\r\n\x1a\n"
+
+@pytest.fixture(scope="module")
+def client():
+    # Just the images router: no startup hooks, no job workers
+    app = FastAPI()
+    app.include_router(images.router, prefix="/api/images")
+    return TestClient(app)
+
+@pytest.fixture(scope="module")
+def blob():
+    data = PNG_HEADER + bytes(range(256)) * (BLOB_CHUNK_SIZE // 128)
+    return blob_store.put(data), data
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-9", (0, 9)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=100-", None),
+    ("bytes=9-3", None),
+    ("bytes=-0", None),
+    ("bytes=0-1,5-6", None),
+    ("items=0-9", None),
+    ("bytes=a-b", None),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 100) == expected
+
+def test_full_blob_with_cache_headers(client, blob):
+    digest, data = blob
+    response = client.get(f"/api/images/blobs/{digest}")
+    assert response.status_code == 200
+    assert response.content == data
+    assert response.headers["etag"] == f'"{digest}"'
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-length"] == str(len(data))
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+
+def test_matching_etag_is_not_modified(client, blob):
+    digest, _ = blob
+    response = client.get(f"/api/images/blobs/{digest}", headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+    assert response.content == b""
+
+def test_range_spanning_chunks(client, blob):
+    digest, data = blob
+    start, end = BLOB_CHUNK_SIZE - 5, BLOB_CHUNK_SIZE + 5
+    response = client.get(f"/api/images/blobs/{digest}", headers={"Range": f"bytes={start}-{end}"})
+    assert response.status_code == 206
+    assert response.content == data[start:end + 1]
+    assert response.headers["content-range"] == f"bytes {start}-{end}/{len(data)}"
+    assert response.headers["content-length"] == str(end - start + 1)
+
+def test_suffix_range(client, blob):
+    digest, data = blob
+    response = client.get(f"/api/images/blobs/{digest}", headers={"Range": "bytes=-16"})
+    assert response.status_code == 206
+    assert response.content == data[-16:]
+
+def test_unsatisfiable_range(client, blob):
+    digest, data = blob
+    response = client.get(f"/api/images/blobs/{digest}", headers={"Range": f"bytes={len(data)}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+def test_stale_if_range_gets_the_whole_blob(client, blob):
+    digest, data = blob
+    response = client.get(f"/api/images/blobs/{digest}", headers={"Range": "bytes=0-9", "If-Range": '"something-else"'})
+    assert response.status_code == 200
+    assert response.content == data
+
+@pytest.mark.parametrize("digest", ["0" * 64, "not-a-digest"])
+def test_unknown_blob_is_not_found(client, digest):
+    assert client.get(f"/api/images/blobs/{digest}").status_code == 404
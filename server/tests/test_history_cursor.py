@@ -0,0 +1,64 @@
+import json
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models.generated_image import GeneratedImage
+from app.routes.images import encode_history_cursor, decode_history_cursor, get_image_history
+
+def add_images(user_id, created):
+    db = SessionLocal()
+    for i, created_at in enumerate(created):
+        db.add(GeneratedImage(
+            id=f"{user_id}-{i:02d}",
+            user_id=user_id,
+            original_prompt=f"prompt {i}",
+            enhanced_prompt=f"prompt {i}",
+            image_urls=[],
+            created_at=created_at
+        ))
+    db.commit()
+    db.close()
+
+def fetch_pages(user_id, limit):
+    """Follow X-Next-Cursor to the end; returns the pages as lists of ids"""
+    async def main():
+        pages = []
+        cursor = None
+        while True:
+            async with AsyncSessionLocal() as db:
+                response = await get_image_history(user_id=user_id, skip=0, limit=limit, cursor=cursor, db=db)
+            pages.append([image["id"] for image in json.loads(response.body)])
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                return pages
+    return main()
+
+def test_cursor_round_trip():
+    image = GeneratedImage(id="img-1", created_at=datetime(2026, 10, 18, 12, 30, 15, 250000))
+    assert decode_history_cursor(encode_history_cursor(image)) == (image.created_at, "img-1")
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "bm90IGpzb24", "WzFd"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as info:
+        decode_history_cursor(cursor)
+    assert info.value.status_code == 400
+
+def test_paging_visits_every_row_once_newest_first(run):
+    base = datetime(2026, 10, 18, 12, 0, 0)
+    # Ties on created_at straddle page boundaries
+    created = [base, base, base, base + timedelta(seconds=1), base + timedelta(seconds=1),
+               base + timedelta(seconds=2), base + timedelta(microseconds=5), base - timedelta(days=1)]
+    add_images("u1", created)
+    add_images("u2", [base])
+
+    pages = run(fetch_pages("u1", limit=3))
+    ids = [image_id for page in pages for image_id in page]
+    assert sorted(ids) == sorted(f"u1-{i:02d}" for i in range(len(created)))
+    assert len(ids) == len(set(ids))
+    order = [(created[int(image_id[-2:])], image_id) for image_id in ids]
+    assert order == sorted(order, key=lambda row: (-row[0].timestamp(), row[1]))
+
+def test_no_cursor_on_a_short_page(run):
+    add_images("u1", [datetime(2026, 10, 18, 12, 0, 0)])
+    assert run(fetch_pages("u1", limit=5)) == [["u1-00"]]
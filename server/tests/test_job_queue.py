@@ -0,0 +1,173 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from app.database import AsyncSessionLocal, SessionLocal
+from app.models.generation_job import GenerationJob
+from app.services import job_queue
+from app.services.job_queue import GenerationJobQueue, JobQueueFull
+
+LEASE_SECONDS = 60
+
+def add_job(status, owner=None, heartbeat_age=None, age=0):
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    job = GenerationJob(
+        id=job_id,
+        user_id="u1",
+        prompt=f"{status} job",
+        status=status,
+        owner=owner,
+        heartbeat_at=now - timedelta(seconds=heartbeat_age) if heartbeat_age is not None else None,
+        created_at=now - timedelta(seconds=age),
+        updated_at=now - timedelta(seconds=age) if status != GenerationJob.QUEUED else None
+    )
+    db = SessionLocal()
+    db.add(job)
+    db.commit()
+    db.close()
+    return job_id
+
+def job_row(job_id):
+    db = SessionLocal()
+    try:
+        return db.get(GenerationJob, job_id)
+    finally:
+        db.close()
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Record the prompts the workers run instead of generating images"""
+    prompts = []
+
+    class Image:
+        id = None
+
+    async def fake_run_generation_coalesced(user_id, prompt, category=None, force=False):
+        prompts.append(prompt)
+        return Image()
+
+    monkeypatch.setattr(job_queue, "run_generation_coalesced", fake_run_generation_coalesced)
+    return prompts
+
+def test_reclaim_only_takes_over_expired_leases(run):
+    live = add_job(GenerationJob.RUNNING, owner="peer", heartbeat_age=5, age=600)
+    stale = add_job(GenerationJob.RUNNING, owner="peer", heartbeat_age=LEASE_SECONDS + 5, age=600)
+    # Rows from before leases existed fall back to updated_at
+    legacy = add_job(GenerationJob.RUNNING, age=LEASE_SECONDS + 5)
+    queue = GenerationJobQueue(lease_seconds=LEASE_SECONDS)
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            return await queue._reclaim_abandoned(db)
+
+    assert sorted(run(main())) == sorted([stale, legacy])
+    assert job_row(live).status == GenerationJob.RUNNING and job_row(live).owner == "peer"
+    for job_id in (stale, legacy):
+        row = job_row(job_id)
+        assert row.status == GenerationJob.QUEUED
+        assert row.owner is None and row.heartbeat_at is None
+
+def test_reclaim_is_not_repeated_by_a_second_process(run):
+    add_job(GenerationJob.RUNNING, owner="peer", heartbeat_age=LEASE_SECONDS + 5, age=600)
+    first = GenerationJobQueue(lease_seconds=LEASE_SECONDS)
+    second = GenerationJobQueue(lease_seconds=LEASE_SECONDS)
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            reclaimed = await first._reclaim_abandoned(db)
+        async with AsyncSessionLocal() as db:
+            return reclaimed, await second._reclaim_abandoned(db)
+
+    reclaimed, again = run(main())
+    assert len(reclaimed) == 1 and again == []
+
+def test_claim_records_owner_and_runs_once(run):
+    job_id = add_job(GenerationJob.QUEUED)
+    first = GenerationJobQueue()
+    second = GenerationJobQueue()
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            return await first._claim(db, job_id), await second._claim(db, job_id)
+
+    assert run(main()) == (True, False)
+    row = job_row(job_id)
+    assert row.status == GenerationJob.RUNNING
+    assert row.owner == first.worker_id and row.heartbeat_at is not None
+
+def test_startup_recovers_queued_and_abandoned_jobs(run, generations):
+    add_job(GenerationJob.QUEUED)
+    add_job(GenerationJob.RUNNING, owner="peer", heartbeat_age=LEASE_SECONDS + 5, age=600)
+    add_job(GenerationJob.RUNNING, owner="peer", heartbeat_age=5, age=600)
+    queue = GenerationJobQueue(workers=2, lease_seconds=LEASE_SECONDS, heartbeat_seconds=3600)
+
+    async def main():
+        await queue.start()
+        await asyncio.sleep(0.3)
+        await queue.stop()
+
+    run(main())
+    assert sorted(generations) == ["queued job", "running job"]
+
+def test_maintenance_sweeps_jobs_left_in_a_dead_peers_queue(run, generations):
+    queue = GenerationJobQueue(workers=1, lease_seconds=LEASE_SECONDS, heartbeat_seconds=0.05)
+
+    async def main():
+        await queue.start()
+        # Created after startup recovery, as if submitted to another process
+        add_job(GenerationJob.QUEUED, age=LEASE_SECONDS + 5)
+        add_job(GenerationJob.QUEUED)
+        await asyncio.sleep(0.3)
+        await queue.stop()
+
+    run(main())
+    # The recent job may still be waiting in its live owner's queue
+    assert generations == ["queued job"]
+    assert queue._pending == set()
+
+def submitted_jobs(prompt):
+    db = SessionLocal()
+    try:
+        return db.query(GenerationJob).filter(GenerationJob.prompt == prompt).all()
+    finally:
+        db.close()
+
+def test_submit_rejects_without_persisting_when_full(run):
+    queue = GenerationJobQueue(max_size=1)
+
+    async def main():
+        queue._queue = asyncio.Queue(maxsize=1)
+        async with AsyncSessionLocal() as db:
+            await queue.submit(db, "u1", "a cat", None, False)
+            with pytest.raises(JobQueueFull):
+                await queue.submit(db, "u1", "a dog", None, False)
+
+    run(main())
+    assert [job.status for job in submitted_jobs("a cat")] == [GenerationJob.QUEUED]
+    assert submitted_jobs("a dog") == []
+
+def test_submit_fails_the_job_when_the_queue_fills_during_commit(run):
+    class RacingQueue(asyncio.Queue):
+        # Room at the check, gone by the time the row is committed
+        def full(self):
+            return False
+
+        def put_nowait(self, item):
+            if self.qsize() >= self.maxsize:
+                raise asyncio.QueueFull()
+            super().put_nowait(item)
+
+    queue = GenerationJobQueue(max_size=1)
+
+    async def main():
+        queue._queue = RacingQueue(maxsize=1)
+        async with AsyncSessionLocal() as db:
+            await queue.submit(db, "u1", "a cat", None, False)
+            with pytest.raises(JobQueueFull):
+                await queue.submit(db, "u1", "a dog", None, False)
+
+    run(main())
+    [job] = submitted_jobs("a dog")
+    assert job.status == GenerationJob.FAILED
+    assert job.error == "Generation queue is full"
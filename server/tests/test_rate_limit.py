@@ -0,0 +1,79 @@
+import pytest
+from app.utils.rate_limit import GenerationRateLimiter, MemoryBackend, SQLiteBackend, RateLimitExceeded
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    if request.param == "memory":
+        backend = MemoryBackend()
+        return lambda: backend
+    return lambda: SQLiteBackend(str(tmp_path / "ratelimit.db"))
+
+def limiter(make_backend, **kwargs):
+    settings = dict(user_rate_per_minute=60, user_burst=3, global_rate_per_minute=600, global_burst=100)
+    settings.update(kwargs)
+    return GenerationRateLimiter(backend=make_backend(), **settings)
+
+def test_burst_is_admitted_then_rejected_with_retry_after(run, make_backend):
+    rate_limiter = limiter(make_backend)
+
+    async def main():
+        for _ in range(3):
+            await rate_limiter.check("u1")
+        with pytest.raises(RateLimitExceeded) as info:
+            await rate_limiter.check("u1")
+        return info.value.retry_after
+
+    retry_after = run(main())
+    # One token per second refills the next request within about a second
+    assert 0 < retry_after <= 1
+    assert rate_limiter.stats()["admitted"] == 3
+    assert rate_limiter.stats()["rejected"] == 1
+
+def test_users_have_separate_buckets(run, make_backend):
+    rate_limiter = limiter(make_backend)
+
+    async def main():
+        for _ in range(3):
+            await rate_limiter.check("u1")
+        with pytest.raises(RateLimitExceeded):
+            await rate_limiter.check("u1")
+        await rate_limiter.check("u2")
+
+    run(main())
+
+def test_global_bucket_limits_everyone(run, make_backend):
+    rate_limiter = limiter(make_backend, global_burst=2)
+
+    async def main():
+        await rate_limiter.check("u1")
+        await rate_limiter.check("u2")
+        with pytest.raises(RateLimitExceeded):
+            await rate_limiter.check("u3")
+
+    run(main())
+
+def test_rejected_request_charges_no_bucket(run, make_backend):
+    rate_limiter = limiter(make_backend, user_burst=1, global_burst=2)
+
+    async def main():
+        await rate_limiter.check("u1")
+        # u1's own bucket rejects this, so the global bucket keeps its token
+        with pytest.raises(RateLimitExceeded):
+            await rate_limiter.check("u1")
+        await rate_limiter.check("u2")
+
+    run(main())
+
+def test_sqlite_buckets_are_shared_between_workers(run, tmp_path):
+    path = str(tmp_path / "ratelimit.db")
+    settings = dict(user_rate_per_minute=60, user_burst=2, global_rate_per_minute=600, global_burst=100)
+    first = GenerationRateLimiter(backend=SQLiteBackend(path), **settings)
+    second = GenerationRateLimiter(backend=SQLiteBackend(path), **settings)
+
+    async def main():
+        await first.check("u1")
+        await second.check("u1")
+        with pytest.raises(RateLimitExceeded):
+            await first.check("u1")
+
+    run(main())
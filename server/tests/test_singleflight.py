@@ -0,0 +1,128 @@
+import asyncio
+import pytest
+from app.services import generation
+from app.utils.singleflight import SingleFlight
+
+def test_concurrent_calls_share_one_run(run):
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", work) for _ in range(5)))
+
+    assert run(main()) == ["done"] * 5
+    assert len(calls) == 1
+    assert flights.in_flight() == 0
+
+def test_distinct_keys_run_separately(run):
+    flights = SingleFlight()
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    async def main():
+        return await asyncio.gather(flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b")))
+
+    assert run(main()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+def test_exception_reaches_every_caller(run):
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    outcomes = run(main())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+def test_cancelled_caller_does_not_cancel_the_flight(run):
+    flights = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flights.do("key", work))
+        second = asyncio.create_task(flights.do("key", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert run(main()) == "done"
+
+def test_key_is_released_after_the_flight(run):
+    flights = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        return len(calls)
+
+    async def main():
+        return [await flights.do("key", work), await flights.do("key", work)]
+
+    assert run(main()) == [1, 2]
+
+@pytest.fixture
+def generations(monkeypatch):
+    """Replace run_generation with a slow fake that records each call"""
+    calls = []
+
+    async def fake_run_generation(db, user_id, prompt, category=None, force=False, before_generate=None):
+        if before_generate is not None:
+            await before_generate()
+        calls.append((user_id, prompt, category, force))
+        await asyncio.sleep(0.05)
+        return (user_id, prompt, category, force)
+
+    monkeypatch.setattr(generation, "run_generation", fake_run_generation)
+    return calls
+
+def coalesced(*requests):
+    async def main():
+        return await asyncio.gather(*(generation.run_generation_coalesced(*request) for request in requests))
+    return main()
+
+def test_trivially_different_prompts_coalesce(run, generations):
+    results = run(coalesced(("u1", "A cat", None, False), ("u1", "a cat!", None, False), ("u1", "a  cat", None, False)))
+    assert len(generations) == 1
+    assert len(set(results)) == 1
+
+def test_forced_and_plain_requests_do_not_coalesce(run, generations):
+    results = run(coalesced(("u1", "a cat", None, False), ("u1", "a cat", None, True), ("u1", "a cat", None, True)))
+    assert sorted(call[3] for call in generations) == [False, True]
+    assert results[0][3] is False
+    assert results[1][3] is True and results[2][3] is True
+
+def test_users_and_categories_do_not_coalesce(run, generations):
+    run(coalesced(("u1", "a cat", None, False), ("u2", "a cat", None, False), ("u1", "a cat", "animals", False)))
+    assert len(generations) == 3
+
+def test_only_the_flight_leader_runs_before_generate(run, generations):
+    charged = []
+
+    async def main():
+        async def charge(name):
+            charged.append(name)
+
+        return await asyncio.gather(*(
+            generation.run_generation_coalesced("u1", "a cat", None, False, before_generate=lambda name=name: charge(name))
+            for name in ("first", "second", "third")
+        ))
+
+    run(main())
+    assert charged == ["first"]
+    assert len(generations) == 1